@@ -1,17 +1,19 @@
 import streamlit as st
-import zipfile
-import io
-import os
 from datetime import datetime
 import pandas as pd
 from pathlib import Path
 import sys
+import time
 
 sys.path.insert(0, str(Path(__file__).parent))
 
-from core.ocr import extract_text_from_pdf
-from core.parser import generate_filename, TEMPLATES
-from core.batch_manager import BatchManager
+from core.parser import TEMPLATES
+from core.classifier import AUTO_DOC_TYPE
+from core.batch_manager import BatchManager, DEFAULT_TARGET_SECONDS, DEFAULT_MAX_BATCH_BYTES
+from core.dedup import ContentIndex
+from core.upload_store import UploadStore
+from core.export import EXPORT_DIR, export_batches, cleanup_exports
+from core.ingest import count_zip_pdfs, iter_zip_members, iter_uploaded_files, ingest
 
 st.set_page_config(
     page_title="Renomeador de PDFs com OCR - Sistema de Lotes",
@@ -21,11 +23,47 @@ st.set_page_config(
 
 # Inicializar session state
 if 'batch_manager' not in st.session_state:
-    st.session_state.batch_manager = BatchManager(batch_size=50)
-if 'uploaded_files_data' not in st.session_state:
-    st.session_state.uploaded_files_data = {}  # Armazenar conteúdo binário aqui
-if 'batch_results_data' not in st.session_state:
-    st.session_state.batch_results_data = {}  # Resultados com bytes
+    st.session_state.batch_manager = BatchManager()  # Tamanho dos lotes: aba Configurações
+if 'uploads' not in st.session_state:
+    st.session_state.uploads = UploadStore()  # PDFs em disco, lidos pelo worker (main.py)
+if 'current_job' not in st.session_state:
+    st.session_state.current_job = []  # Lotes do último envio, acompanhados na aba de upload
+
+MAX_PENDING_BATCHES = 3  # Lotes do envio aguardando o worker antes de pausar a leitura
+JOB_REFRESH_SECONDS = 2  # Intervalo de atualização do progresso do job atual
+JOB_STALL_SECONDS = 120  # Sem nenhum arquivo concluído nesse intervalo: avisar na tela
+
+
+@st.fragment(run_every=JOB_REFRESH_SECONDS)
+def show_job_progress():
+    """Progresso do job atual, reexecutado sozinho sem bloquear as outras abas"""
+    batch_manager = st.session_state.batch_manager
+    job = [batch_manager.get_batch(bid) for bid in st.session_state.current_job]
+    job = [batch for batch in job if batch]
+    total = sum(batch["total_files"] for batch in job) or 1
+    done = sum(batch["processed_files"] + batch["failed_files"] for batch in job)
+    pending = sum(1 for batch in job if batch["status"] == "pending")
+    
+    if all(batch["status"] in ("completed", "failed") for batch in job):
+        # Rerun completo: o fragmento deixa de ser agendado sem job em andamento
+        st.session_state.current_job = []
+        st.session_state.job_finished = True
+        st.rerun()
+    
+    st.progress(min(done / total, 1.0))
+    st.text(f"Processados {done}/{total} arquivos"
+            + (f" - {pending} lotes aguardando o worker" if pending else ""))
+    
+    now = time.monotonic()
+    if st.session_state.get("job_done") != done:
+        st.session_state.job_done = done
+        st.session_state.job_moved_at = now
+    if not batch_manager.active_workers():
+        st.warning("⚠️ Worker offline: os lotes ficam na fila até `python main.py` ser iniciado")
+    elif now - st.session_state.job_moved_at > JOB_STALL_SECONDS:
+        st.warning(f"⚠️ Nenhum arquivo concluído há {int(now - st.session_state.job_moved_at)}s - "
+                   "verifique o worker (python main.py)")
+
 
 st.title("📄 Renomeador de PDFs com OCR - Sistema de Lotes")
 st.markdown("**Processamento otimizado em lotes + Cloud Storage + Notificações**")
@@ -35,7 +73,8 @@ tab1, tab2, tab3, tab4 = st.tabs(["📤 Upload & Processar", "📊 Fila de Taref
 
 with tab1:
     st.subheader("Upload de PDFs")
-    st.info("**Sistema de Lotes Automático**: Arquivos divididos em grupos de 50 PDFs para processamento otimizado")
+    st.info("**Sistema de Lotes Automático**: Arquivos divididos em lotes pelo custo estimado "
+            "(páginas, tamanho e camada de texto) para processamento otimizado")
     
     col1, col2 = st.columns(2)
     
@@ -54,107 +93,82 @@ with tab1:
             key="zip_uploader"
         )
     
-    # Processar ZIP
-    all_files = []
+    # Contagem a partir do diretório central do ZIP: nada é descompactado antes do processamento
+    total_uploaded = 0
     if uploaded_zip:
         try:
-            with zipfile.ZipFile(uploaded_zip, 'r') as zip_ref:
-                for file_info in zip_ref.filelist:
-                    if file_info.filename.lower().endswith('.pdf') and not file_info.is_dir():
-                        pdf_content = zip_ref.read(file_info.filename)
-                        all_files.append({
-                            'name': os.path.basename(file_info.filename),
-                            'content': pdf_content
-                        })
-            if all_files:
-                st.success(f"✅ {len(all_files)} PDFs encontrados no ZIP")
+            total_uploaded = count_zip_pdfs(uploaded_zip)
+            if total_uploaded:
+                st.success(f"✅ {total_uploaded} PDFs encontrados no ZIP")
         except Exception as e:
             st.error(f"❌ Erro ao processar ZIP: {str(e)}")
+    elif uploaded_pdfs:
+        total_uploaded = len(uploaded_pdfs)
     
-    if uploaded_pdfs and not all_files:
-        all_files = [{'name': f.name, 'content': f.read()} for f in uploaded_pdfs]
-    
-    if all_files:
+    if total_uploaded:
         st.markdown("---")
-        st.info(f"📋 **{len(all_files)} arquivos carregados** - Serão divididos em lotes de 50 PDFs")
+        # Configuração da aba ⚙️ (valores da última interação; padrões na primeira execução)
+        manager = st.session_state.batch_manager
+        if st.session_state.get("auto_batch_size", True):
+            manager.batch_size = None
+            manager.policy.target_seconds = st.session_state.get("batch_target_seconds", DEFAULT_TARGET_SECONDS)
+            manager.policy.max_bytes = st.session_state.get(
+                "batch_max_mb", DEFAULT_MAX_BATCH_BYTES // (1024 * 1024)) * 1024 * 1024
+            sizing = "lotes dimensionados pelo custo estimado de cada PDF"
+        else:
+            manager.batch_size = st.session_state.get("batch_size", 50)
+            sizing = f"lotes de {manager.batch_size} PDFs"
+        st.info(f"📋 **{total_uploaded} arquivos carregados** - Serão divididos em {sizing}")
         
         # Configurações
         col_a, col_b = st.columns(2)
         with col_a:
-            doc_type = st.selectbox("Tipo de Documento:", list(TEMPLATES.keys()))
+            doc_type = st.selectbox("Tipo de Documento:", [AUTO_DOC_TYPE] + list(TEMPLATES.keys()))
         with col_b:
             pattern = st.text_input("Padrão:", value="NF + Número")
         
         if st.button("🚀 Criar Lotes e Iniciar Processamento", type="primary", use_container_width=True):
-            # Salvar arquivos no session state
-            st.session_state.uploaded_files_data = {f['name']: f['content'] for f in all_files}
-            
-            # Criar lotes (sem conteúdo binário)
-            batch_ids = st.session_state.batch_manager.create_batches(all_files, doc_type, pattern)
-            st.success(f"✅ {len(batch_ids)} lotes criados! Processando...")
-            
-            # Processar cada lote
-            for batch_id in batch_ids:
-                batch = st.session_state.batch_manager.get_batch(batch_id)
-                st.session_state.batch_manager.update_batch_status(batch_id, "processing")
-                
-                # Inicializar armazenamento de resultados
-                if batch_id not in st.session_state.batch_results_data:
-                    st.session_state.batch_results_data[batch_id] = []
-                
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-                
-                for idx, file_meta in enumerate(batch['files']):
-                    status_text.text(f"Lote {batch_id}: Processando {idx+1}/{len(batch['files'])}")
-                    
-                    # Recuperar conteúdo binário
-                    file_name = file_meta['name']
-                    file_content = st.session_state.uploaded_files_data.get(file_name)
-                    
-                    if not file_content:
-                        st.session_state.batch_manager.add_batch_error(batch_id, {
-                            "file": file_name,
-                            "error": "Arquivo não encontrado"
-                        })
-                        continue
-                    
-                    try:
-                        # Extrair texto
-                        text = extract_text_from_pdf(file_content, max_pages=2, dpi=150)
-                        
-                        # Gerar nome
-                        new_name = generate_filename(text, doc_type, pattern)
-                        if not new_name:
-                            new_name = f"SEM_DADOS_{idx}"
-                        
-                        # Salvar resultado (metadados no BatchManager, bytes no session state)
-                        st.session_state.batch_manager.add_batch_result(batch_id, {
-                            "original": file_name,
-                            "novo": f"{new_name}.pdf"
-                        })
-                        
-                        # Salvar bytes separadamente
-                        st.session_state.batch_results_data[batch_id].append({
-                            "original": file_name,
-                            "novo": f"{new_name}.pdf",
-                            "content": file_content
-                        })
-                        
-                    except Exception as e:
-                        st.session_state.batch_manager.add_batch_error(batch_id, {
-                            "file": file_name,
-                            "error": str(e)
-                        })
-                    
-                    progress_bar.progress((idx + 1) / len(batch['files']))
-                
-                st.session_state.batch_manager.update_batch_status(batch_id, "completed")
-                progress_bar.empty()
-                status_text.empty()
+            # Ingestão preguiçosa: cada PDF é lido (um por vez) direto para o UploadStore e
+            # cada lote entra na fila assim que completa, enquanto o resto ainda é lido
+            # Caminho completo dos membros: arquivos homônimos em pastas diferentes não colidem
+            if uploaded_zip:
+                uploaded_zip.seek(0)
+                members = iter_zip_members(uploaded_zip)
+            else:
+                members = iter_uploaded_files(uploaded_pdfs)
+            content_index = ContentIndex(store=st.session_state.uploads)  # Só handles, sem bytes
             
-            st.success("✅ Todos os lotes processados!")
-            st.rerun()
+            ingest_bar = st.progress(0)
+            st.session_state.current_job = []
+            st.session_state.pop("job_done", None)  # Reinicia a contagem de "sem progresso"
+            try:
+                for batch_id in st.session_state.batch_manager.create_batches_streaming(
+                        ingest(members, content_index, prescan=True), doc_type, pattern,
+                        max_pending=MAX_PENDING_BATCHES):
+                    st.session_state.current_job.append(batch_id)
+                    ingest_bar.progress(min(len(content_index.files) / total_uploaded, 1.0))
+            except Exception as e:
+                # Ex.: ZIP corrompido ou truncado: os lotes já enfileirados seguem para o worker
+                queued = len(st.session_state.current_job)
+                st.error(f"❌ Erro ao ler os arquivos: {str(e)}"
+                         + (f" - {queued} lotes já enfileirados continuam na fila" if queued else ""))
+            else:
+                st.success(f"✅ {len(st.session_state.current_job)} lotes enfileirados!")
+                dedup = content_index.stats()
+                if dedup["duplicates"]:
+                    st.info(
+                        f"♻️ **{dedup['duplicates']} arquivos duplicados** (mesmo conteúdo) serão processados "
+                        f"uma única vez - {dedup['bytes_saved'] / 1024 / 1024:.1f} MB a menos em OCR"
+                    )
+            finally:
+                ingest_bar.empty()
+    
+    # Acompanhar o job atual (o processamento continua mesmo se a página for fechada)
+    if st.session_state.current_job:
+        st.markdown("---")
+        show_job_progress()
+    elif st.session_state.pop("job_finished", False):
+        st.success("✅ Todos os lotes processados! Baixe os resultados na aba 'Fila de Tarefas'")
 
 with tab2:
     st.subheader("📊 Fila de Tarefas")
@@ -187,6 +201,21 @@ with tab2:
         df = pd.DataFrame(batch_data)
         st.dataframe(df, use_container_width=True, hide_index=True)
         
+        # Lotes interrompidos (queda do worker, erro) continuam do primeiro arquivo pendente
+        interrupted = [bid for bid, b in batches.items() if b['status'] in ('processing', 'failed')]
+        if interrupted:
+            col_r1, col_r2 = st.columns([3, 1])
+            with col_r1:
+                resume_id = st.selectbox("Retomar lote interrompido:", interrupted)
+            with col_r2:
+                st.write("")
+                if st.button("▶️ Retomar", use_container_width=True):
+                    if st.session_state.batch_manager.resume_batch(resume_id):
+                        pending = len(st.session_state.batch_manager.pending_files(resume_id))
+                        st.success(f"✅ Lote {resume_id} devolvido à fila ({pending} arquivos restantes)")
+                    else:
+                        st.warning("O lote ainda está sendo processado por um worker ativo")
+        
         # Download dos lotes completados
         st.markdown("---")
         st.subheader("⬇️ Download dos Lotes Processados")
@@ -194,30 +223,41 @@ with tab2:
         completed_batches = [bid for bid, b in batches.items() if b['status'] == 'completed']
         
         if completed_batches:
-            selected_batch = st.selectbox("Selecione um lote:", completed_batches)
+            # Lotes criados no mesmo envio compartilham o job_id
+            jobs = {}
+            for bid in completed_batches:
+                jobs.setdefault(batches[bid].get('job_id', bid), []).append(bid)
+            
+            scope = st.radio("Exportar:", ["Um lote", "Job inteiro (todos os lotes concluídos)"], horizontal=True)
+            if scope == "Um lote":
+                selected = st.selectbox("Selecione um lote:", completed_batches)
+                export_ids, export_label = [selected], f"Lote_{selected}"
+            else:
+                selected = st.selectbox(
+                    "Selecione um job:", list(jobs),
+                    format_func=lambda job: f"{job} ({len(jobs[job])} lotes)"
+                )
+                export_ids, export_label = jobs[selected], f"Job_{selected}"
             
             if st.button("📥 Baixar ZIP", use_container_width=True):
-                # Recuperar resultados com bytes
-                results = st.session_state.batch_results_data.get(selected_batch, [])
+                # ZIP gravado em disco entrada por entrada a partir do UploadStore (PDFs sem recompressão)
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                export_path = EXPORT_DIR / f"{export_label}_{timestamp}.zip"
+                cleanup_exports(EXPORT_DIR)
+                exported = export_batches(st.session_state.batch_manager, export_ids,
+                                          st.session_state.uploads, export_path)
                 
-                if results:
-                    # Criar ZIP
-                    zip_buffer = io.BytesIO()
-                    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
-                        for result in results:
-                            zf.writestr(result['novo'], result['content'])
-                    
-                    zip_buffer.seek(0)
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    
-                    st.download_button(
-                        label=f"📥 Baixar Lote {selected_batch}",
-                        data=zip_buffer,
-                        file_name=f"Lote_{selected_batch}_{timestamp}.zip",
-                        mime="application/zip",
-                        use_container_width=True
-                    )
+                if exported["files"]:
+                    with open(export_path, "rb") as zip_file:
+                        st.download_button(
+                            label=f"📥 Baixar {export_label.replace('_', ' ')} ({exported['files']} PDFs)",
+                            data=zip_file,
+                            file_name=export_path.name,
+                            mime="application/zip",
+                            use_container_width=True
+                        )
                 else:
+                    export_path.unlink(missing_ok=True)
                     st.warning("Nenhum resultado encontrado para este lote")
         else:
             st.info("Nenhum lote completado ainda")
@@ -277,13 +317,29 @@ with tab4:
             st.error("Email inválido")
     
     st.markdown("### ⚡ Performance")
-    batch_size = st.slider("Tamanho do lote:", 10, 100, 50, 10)
-    st.caption(f"PDFs em grupos de {batch_size}")
+    auto_batch_size = st.checkbox(
+        "Tamanho do lote automático", value=True, key="auto_batch_size",
+        help="Calcula cada lote pelas páginas, tamanho e camada de texto dos PDFs "
+             "e pela velocidade observada nos lotes anteriores"
+    )
+    if auto_batch_size:
+        target_seconds = st.slider("Duração alvo por lote (segundos):", 30, 600,
+                                   DEFAULT_TARGET_SECONDS, 30, key="batch_target_seconds")
+        max_mb = st.slider("Memória máxima por lote (MB):", 64, 2048,
+                           DEFAULT_MAX_BATCH_BYTES // (1024 * 1024), 64, key="batch_max_mb")
+        st.caption(f"Lotes de ~{target_seconds}s e até {max_mb} MB: PDFs digitais de 1 página "
+                   f"em lotes grandes, processos escaneados longos em lotes menores")
+    else:
+        batch_size = st.slider("Tamanho do lote:", 10, 100, 50, 10, key="batch_size")
+        st.caption(f"PDFs em grupos de {batch_size}")
     
     st.markdown("### 🗑️ Limpeza")
     if st.button("🧹 Limpar lotes antigos (>7 dias)"):
         removed = st.session_state.batch_manager.clear_completed_batches()
-        st.success(f"✅ {removed} lotes removidos")
+        # PDFs enviados sem nenhum lote que ainda os referencie
+        freed = st.session_state.uploads.evict(st.session_state.batch_manager.content_refs())
+        st.success(f"✅ {removed} lotes removidos, {freed['files']} PDFs apagados "
+                   f"({freed['bytes'] / 1024 / 1024:.1f} MB)")
 
 st.markdown("---")
 st.caption(f"Sistema ativo | {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
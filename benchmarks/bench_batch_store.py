@@ -0,0 +1,51 @@
+"""
+Benchmark: custo de persistir um resultado por arquivo em cada backend do BatchManager
+
+Compara JSON (regrava o arquivo inteiro), JSON com journal (gravação agrupada)
+e SQLite (WAL, uma linha por resultado).
+
+Uso:
+    python -m benchmarks.bench_batch_store [--files 2000]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from core.batch_manager import BatchManager
+
+
+def measure(label, files, **manager_kwargs):
+    manager = BatchManager(batch_size=files, **manager_kwargs)
+    batch_id = manager.create_batches([{"name": f"doc_{i:05d}.pdf"} for i in range(files)],
+                                      "Notas Fiscais", "NF + Número")[0]
+    stats = {"pages": [{"page": 1, "text_chars": 900, "ocr": False, "seconds": 0.004}]}
+
+    start = time.perf_counter()
+    for i in range(files):
+        manager.add_batch_result(batch_id, {"original": f"doc_{i:05d}.pdf",
+                                            "novo": f"NF_{i}.pdf", "stats": stats})
+    manager.store.close()
+    elapsed = time.perf_counter() - start
+
+    assert manager.get_batch(batch_id)["processed_files"] == files
+    print(f"{label:<28}{elapsed:>10.3f}{elapsed / files * 1e6:>14.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'backend':<28}{'tempo (s)':>10}{'µs/arquivo':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        measure("json", args.files, storage_path=os.path.join(tmp, "a.json"))
+        measure("json + journal (N=100)", args.files, storage_path=os.path.join(tmp, "b.json"),
+                journal={"flush_every": 100, "flush_interval_ms": 500})
+        measure("json + journal (N=1)", args.files, storage_path=os.path.join(tmp, "c.json"),
+                journal={"flush_every": 1})
+        measure("sqlite", args.files, storage_path=os.path.join(tmp, "d.sqlite"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark: páginas/s do OCR com pytesseract (processo por página) vs.
+tesserocr (engine residente)
+
+Uso:
+    python -m benchmarks.bench_ocr_backend [--pages 40] [--dpi 150]
+"""
+import argparse
+import time
+
+import fitz  # PyMuPDF
+
+from benchmarks.corpus import make_scanned_pdf
+from core.ocr import create_ocr_backend
+
+
+def render_pages(count, dpi):
+    """Renderiza `count` páginas escaneadas como pixmaps em tons de cinza"""
+    pixmaps = []
+    doc = fitz.open("pdf", make_scanned_pdf(pages=count))
+    zoom = dpi / 72
+    for page in doc:
+        pixmaps.append(page.get_pixmap(matrix=fitz.Matrix(zoom, zoom),
+                                       colorspace=fitz.csGRAY, alpha=False))
+    doc.close()
+    return pixmaps
+
+
+def measure(backend_name, images):
+    try:
+        backend = create_ocr_backend(backend_name)
+    except Exception as e:
+        print(f"{backend_name:<14}indisponível ({e})")
+        return
+
+    try:
+        # Primeira página fora da medição (carregamento do modelo no backend residente)
+        backend.pixmap_to_string(images[0])
+        start = time.perf_counter()
+        for pix in images:
+            backend.pixmap_to_string(pix)
+        elapsed = time.perf_counter() - start
+    finally:
+        backend.close()
+
+    print(f"{backend_name:<14}{elapsed:>10.2f}{len(images) / elapsed:>12.2f}"
+          f"{elapsed / len(images) * 1000:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--dpi", type=int, default=150)
+    args = parser.parse_args()
+
+    images = render_pages(args.pages, args.dpi)
+
+    print(f"{'backend':<14}{'tempo (s)':>10}{'páginas/s':>12}{'ms/página':>12}")
+    for name in ("pytesseract", "tesserocr"):
+        measure(name, images)
+
+
+if __name__ == "__main__":
+    main()
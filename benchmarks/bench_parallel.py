@@ -0,0 +1,74 @@
+"""
+Benchmark: extração serial vs. paralela (ParallelExtractor) vs. em estágios (PipelineExtractor)
+
+Uso:
+    python -m benchmarks.bench_parallel [--files 32] [--workers 1,2,4,8]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.corpus import make_scanned_pdf, make_text_pdf
+from core.batch_manager import BatchManager
+from core.parallel import ParallelExtractor, process_file, default_workers
+from core.pipeline import PipelineExtractor
+
+
+def run_serial(files_data):
+    start = time.perf_counter()
+    for idx, (name, content) in enumerate(files_data.items()):
+        process_file(name, content, "Notas Fiscais", "NF + Número", idx, {"use_cache": False})
+    return time.perf_counter() - start
+
+
+def run_parallel(files_data, workers, storage_path, extractor_class=ParallelExtractor):
+    manager = BatchManager(batch_size=len(files_data), storage_path=storage_path)
+    files = [{"name": name} for name in files_data]
+    batch_id = manager.create_batches(files, "Notas Fiscais", "NF + Número")[0]
+
+    # Sem cache de OCR: cada execução extrai de novo (senão a primeira aquece o
+    # cache e as seguintes medem consultas ao SQLite, não o paralelismo)
+    with extractor_class(max_workers=workers, use_cache=False) as extractor:
+        # Aquecer o pool (criação dos processos fora da medição)
+        list(extractor._get_executor().map(abs, range(workers)))
+
+        start = time.perf_counter()
+        for _ in extractor.process_batch(manager, batch_id, files_data):
+            pass
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=32)
+    parser.add_argument("--workers", default="")
+    args = parser.parse_args()
+
+    cpus = default_workers()
+    worker_counts = [int(w) for w in args.workers.split(",") if w] or sorted({1, 2, 4, cpus})
+
+    print(f"Gerando {args.files} PDFs (metade escaneados)...")
+    # Lote misto: metade escaneada, metade digital (a triagem do pipeline tira
+    # os digitais do pool de OCR)
+    files_data = {f"nf_{i:04d}.pdf": make_scanned_pdf(i) if i % 2 else make_text_pdf(i)
+                  for i in range(args.files)}
+
+    serial = run_serial(files_data)
+    print(f"{'modo':<12}{'tempo (s)':>12}{'PDFs/s':>10}{'speedup':>10}")
+    print(f"{'serial':<12}{serial:>12.2f}{args.files / serial:>10.2f}{1.0:>10.2f}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in worker_counts:
+            storage = os.path.join(tmp, f"batches_{workers}.json")
+            elapsed = run_parallel(files_data, workers, storage)
+            print(f"{f'{workers} workers':<12}{elapsed:>12.2f}"
+                  f"{args.files / elapsed:>10.2f}{serial / elapsed:>10.2f}")
+            storage = os.path.join(tmp, f"pipeline_{workers}.json")
+            elapsed = run_parallel(files_data, workers, storage, PipelineExtractor)
+            print(f"{f'{workers} pipeline':<12}{elapsed:>12.2f}"
+                  f"{args.files / elapsed:>10.2f}{serial / elapsed:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
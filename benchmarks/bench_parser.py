@@ -0,0 +1,243 @@
+"""
+Benchmark: throughput e latência do core.parser com baseline JSON
+
+Mede, para cada template, sobre um corpus sintético de textos de OCR
+(ruído, acentos e documentos longos):
+- generate_filename: documentos/s, latência p50/p99/máxima
+- extract_field: chamadas/s e latência máxima por campo
+- entradas patológicas que podem provocar backtracking nos regex
+  (ex.: `\\s*[:\\s]*` seguido de muitos espaços, grupos `[A-Za-zÀ-ú\\s]{3,40}`
+  repetidos sem terminador)
+
+Os resultados são comparados com o baseline JSON; qualquer métrica pior que
+o baseline além da tolerância faz o processo terminar com código 1.
+Para comparar máquinas diferentes, os tempos são escalados por uma carga de
+calibração medida junto com o baseline.
+
+Uso:
+    python -m benchmarks.bench_parser [--docs 200] [--tolerance 1.0]
+    python -m benchmarks.bench_parser --update-baseline
+"""
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+
+from benchmarks.corpus import make_ocr_text, add_ocr_noise
+from core.parser import TEMPLATES, extract_field, generate_filename
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "parser.json")
+
+# Padrão de nomenclatura que usa todas as partes de todos os templates
+BENCH_PATTERN = "Número + Data + Valor + Parte"
+
+# Variações do corpus: (nome, palavras de preenchimento, campos no fim, taxa de ruído)
+CORPUS_VARIANTS = [
+    ("curto", 200, False, 0.0),
+    ("ruidoso", 600, False, 0.03),
+    ("longo", 6000, True, 0.02),
+]
+
+# Métricas em que um valor maior é melhor (as demais são latências)
+HIGHER_IS_BETTER = ("docs_per_s", "calls_per_s")
+
+
+def pathological_inputs():
+    """Textos que exercitam os piores casos de backtracking dos padrões atuais"""
+    spaces = " " * 2000
+    return {
+        # Prefixo seguido de \s*[:\s]* e nenhum número: quadrático no tamanho do espaço
+        "prefixo_espacos": f"NF{spaces}x\nValor{spaces}x\nSinistro{spaces}x\n",
+        "prefixo_dois_pontos": "Valor" + " :" * 1000 + " x\nProcesso" + ": " * 1000 + "x\n",
+        # Nomes longos sem terminador: grupos [A-Za-zÀ-ú\s]{3,40} reavaliados a cada âncora
+        "nomes_repetidos": "\n".join(
+            f"Autor: Áaa {'ção ' * 30}Beneficiário: Segurado: Fornecedor: Éee {'ãõ ' * 40}"
+            for _ in range(200)
+        ),
+        # Quase-acertos do número CNJ e sequências numéricas longas
+        "numeros_quase": "\n".join(
+            f"Processo: 1234567-12.2024.8.2 N{'º' if i % 2 else 'ª'} {'9' * 9}" for i in range(500)
+        ) + "\n" + "1" * 20000,
+        "datas_quase": " ".join("12/03/202 12-03-20x 1203/2024" for _ in range(2000)),
+        "valores_longos": "R$ " + ".".join(["123"] * 5000) + ",x\nTOTAL " + "1" * 5000,
+    }
+
+
+def calibrate(repeat=10) -> float:
+    """Tempo (s) de uma carga fixa de regex + Python puro, para escalar o baseline"""
+    text = "abc 12/03/2024 def " * 2000
+    pattern = re.compile(r"(\d{2}[/-]\d{2}[/-]\d{4})")
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(20):
+            pattern.findall(text)
+            sum(len(word) for word in text.split())
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def best_latencies(func, corpus, repeat):
+    """Latência (s) de cada texto: a menor de `repeat` execuções, para filtrar ruído do sistema"""
+    latencies = [float("inf")] * len(corpus)
+    for _ in range(repeat):
+        for i, text in enumerate(corpus):
+            start = time.perf_counter()
+            func(text)
+            latencies[i] = min(latencies[i], time.perf_counter() - start)
+    return latencies
+
+
+def measure_generate_filename(doc_type, corpus, repeat):
+    latencies = best_latencies(lambda text: generate_filename(text, doc_type, BENCH_PATTERN),
+                               corpus, repeat)
+    return {
+        "docs_per_s": len(corpus) / sum(latencies),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": max(latencies) * 1000,
+    }
+
+
+def measure_extract_field(regex_patterns, corpus, repeat):
+    results = {}
+    for field in regex_patterns:
+        latencies = best_latencies(lambda text: extract_field(text, field, regex_patterns),
+                                   corpus, repeat)
+        results[field] = {
+            "calls_per_s": len(corpus) / sum(latencies),
+            "max_ms": max(latencies) * 1000,
+        }
+    return results
+
+
+def measure_pathological(repeat):
+    """Pior latência (ms) de generate_filename por template em cada entrada patológica"""
+    results = {}
+    for case, text in pathological_inputs().items():
+        for doc_type in TEMPLATES:
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                generate_filename(text, doc_type, BENCH_PATTERN)
+                timings.append(time.perf_counter() - start)
+            results[f"{case}/{doc_type}"] = {"max_ms": min(timings) * 1000}
+    return results
+
+
+def run(docs, repeat):
+    rng = random.Random(42)
+    metrics = {}
+
+    for doc_type, template in TEMPLATES.items():
+        for variant, filler_words, fields_at_end, noise in CORPUS_VARIANTS:
+            corpus = [
+                add_ocr_noise(make_ocr_text(doc_type, rng, filler_words, fields_at_end), rng, noise)
+                for _ in range(docs)
+            ]
+            prefix = f"{doc_type}/{variant}"
+            metrics[f"generate_filename/{prefix}"] = measure_generate_filename(doc_type, corpus, repeat)
+            for field, values in measure_extract_field(template["regex_patterns"], corpus, repeat).items():
+                metrics[f"extract_field/{prefix}/{field}"] = values
+
+    for name, values in measure_pathological(repeat).items():
+        metrics[f"patologico/{name}"] = values
+
+    return metrics
+
+
+def compare(metrics, baseline, scale, tolerance):
+    """
+    Compara as métricas com o baseline (tempos escalados pela calibração)
+
+    Returns:
+        list: Descrições das regressões encontradas
+    """
+    regressions = []
+    for name, values in metrics.items():
+        reference = baseline["metrics"].get(name)
+        if reference is None:
+            continue
+        for metric, value in values.items():
+            if metric not in reference or metric == "max_ms" and not name.startswith("patologico/"):
+                # Latência máxima em corpus normal é ruidosa demais para reprovar a execução
+                continue
+            if metric in HIGHER_IS_BETTER:
+                expected = reference[metric] / scale
+                failed = value < expected / (1 + tolerance)
+            else:
+                expected = reference[metric] * scale
+                failed = value > expected * (1 + tolerance)
+            if failed:
+                regressions.append(f"{name} {metric}: {value:.3f} (baseline {expected:.3f})")
+    return regressions
+
+
+def print_report(metrics):
+    print(f"{'métrica':<72}{'docs/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'máx ms':>10}")
+    for name, values in metrics.items():
+        rate = values.get("docs_per_s", values.get("calls_per_s"))
+        cells = [
+            f"{rate:>10.0f}" if rate is not None else f"{'':>10}",
+            f"{values['p50_ms']:>9.3f}" if "p50_ms" in values else f"{'':>9}",
+            f"{values['p99_ms']:>9.3f}" if "p99_ms" in values else f"{'':>9}",
+            f"{values['max_ms']:>10.3f}",
+        ]
+        print(f"{name:<72}{''.join(cells)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Execuções por medição; vale a menor (default: 5)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=1.0,
+                        help="Piora relativa aceita antes de reprovar (default: 1.0 = 2x mais lento)")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Grava as métricas desta execução como novo baseline")
+    args = parser.parse_args()
+
+    calibration = calibrate()
+    metrics = run(args.docs, args.repeat)
+    print_report(metrics)
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"docs": args.docs, "calibration_s": calibration, "metrics": metrics},
+                      f, ensure_ascii=False, indent=2, sort_keys=True)
+        print(f"\nBaseline gravado em {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\nSem baseline em {args.baseline}; execute com --update-baseline")
+        return
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    scale = calibration / baseline["calibration_s"]
+    regressions = compare(metrics, baseline, scale, args.tolerance)
+    print(f"\nCalibração: {scale:.2f}x o tempo da máquina do baseline")
+    if regressions:
+        print(f"{len(regressions)} regressão(ões) acima de {args.tolerance:.0%}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("Sem regressões em relação ao baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Geração de PDFs sintéticos para os benchmarks
+"""
+import fitz  # PyMuPDF
+
+
+SAMPLE_NF_TEXT = (
+    "NOTA FISCAL ELETRÔNICA\n"
+    "NF Nº 000{num}\n"
+    "Data de emissão: 15/03/2024\n"
+    "Fornecedor: Comercial Exemplo Ltda\n"
+    "Descrição dos produtos e serviços\n"
+    "Valor total: R$ 1.234,56\n"
+)
+
+
+def make_text_pdf(num=1, pages=2) -> bytes:
+    """PDF digital (com camada de texto)"""
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), SAMPLE_NF_TEXT.format(num=num), fontsize=12)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def make_scanned_pdf(num=1, pages=2, dpi=200) -> bytes:
+    """PDF escaneado (apenas imagem, sem camada de texto)"""
+    source = fitz.open("pdf", make_text_pdf(num, pages))
+    doc = fitz.open()
+    for src_page in source:
+        pix = src_page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+        page = doc.new_page(width=src_page.rect.width, height=src_page.rect.height)
+        page.insert_image(page.rect, pixmap=pix)
+    source.close()
+    data = doc.tobytes(deflate=True)
+    doc.close()
+    return data
+
+
+# Cabeçalhos típicos por tipo de documento (campos que os templates procuram)
+OCR_HEADERS = {
+    "Notas Fiscais": "NOTA FISCAL ELETRÔNICA\nNF Nº {num}\nEmissão: {date}\nValor total R$ {value}",
+    "Comprovantes de Pagamento": "Comprovante de pagamento\nBeneficiário: {name}\nData: {date}\nValor: R$ {value}",
+    "Processos Judiciais": "Processo: {cnj}\nAutor: {name}\nDistribuído em {date}",
+    "Processos de Sinistros": "Aviso de Sinistro: {num}\nSegurado: {name}\nOcorrência em {date}",
+}
+
+FILLER_WORDS = (
+    "empresa ltda produto serviço quantidade unidade descrição código cfop icms "
+    "base cálculo transportadora volume peso bruto líquido observações endereço "
+    "município bairro cep inscrição estadual natureza operação protocolo"
+).split()
+
+NAMES = ["Maria Silva", "João Souza", "Comercial Exemplo", "Ana Pereira Lima", "José Carlos"]
+
+
+def make_ocr_text(doc_type, rng, filler_words=600, fields_at_end=False) -> str:
+    """
+    Texto sintético no formato da saída do OCR para um tipo de documento
+
+    Args:
+        doc_type: Chave de TEMPLATES
+        rng: random.Random
+        filler_words: Quantidade de palavras de preenchimento
+        fields_at_end: Coloca o cabeçalho com os campos no fim do texto (pior caso)
+    """
+    header = OCR_HEADERS[doc_type].format(
+        num=rng.randint(100, 999999),
+        date=f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(2015, 2025)}",
+        value=f"{rng.randint(1, 99)}.{rng.randint(0, 999):03d},{rng.randint(0, 99):02d}",
+        name=rng.choice(NAMES),
+        cnj=f"{rng.randint(0, 9999999):07d}-{rng.randint(0, 99):02d}.2024.8.26.{rng.randint(0, 9999):04d}",
+    )
+    lines = []
+    for _ in range(filler_words // 10):
+        lines.append(" ".join(rng.choice(FILLER_WORDS) for _ in range(10)))
+    body = "\n".join(lines)
+    return f"{body}\n{header}" if fields_at_end else f"{header}\n{body}"
+
+
+# Confusões típicas do OCR (caractere -> substitutos possíveis)
+OCR_CONFUSIONS = {
+    "0": ("O", "o", "D"), "1": ("l", "I", "|"), "5": ("S",), "8": ("B",), "2": ("Z",),
+    "O": ("0",), "l": ("1",), "e": ("c",), "m": ("rn",), "ç": ("c",), "ã": ("a",), "é": ("e",),
+}
+
+
+def add_ocr_noise(text, rng, rate=0.02) -> str:
+    """
+    Aplica ruído de OCR: trocas de caracteres confundíveis, espaços duplicados,
+    quebras de linha espúrias e acentos perdidos, com a probabilidade `rate` por caractere
+    """
+    noisy = []
+    for char in text:
+        roll = rng.random()
+        if roll < rate and char in OCR_CONFUSIONS:
+            noisy.append(rng.choice(OCR_CONFUSIONS[char]))
+        elif roll < rate * 1.5 and char == " ":
+            noisy.append(rng.choice(("  ", "\n", "  ")))
+        else:
+            noisy.append(char)
+    return "".join(noisy)
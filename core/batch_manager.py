@@ -1,38 +1,183 @@
 """
 Gerenciador de lotes para processamento de grandes quantidades de PDFs
 """
-import json
+import os
+import time
 import uuid
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple
 from pathlib import Path
 
+from core.batch_store import BatchStore, DEFAULT_STORE_PATH, create_batch_store
+
+
+def new_job_id() -> str:
+    """Identificador curto de um job (conjunto de lotes de um mesmo envio)"""
+    return str(uuid.uuid4())[:8]
+
+
+# Política de dimensionamento automático dos lotes (ver BatchPolicy)
+DEFAULT_TARGET_SECONDS = 120              # Duração alvo de um lote no worker
+DEFAULT_MAX_BATCH_BYTES = 512 * 1024 * 1024  # Teto de memória estimada por lote
+MIN_BATCH_SIZE = 1
+MAX_BATCH_SIZE = 500
+DEFAULT_PAGE_SECONDS = {"text": 0.02, "ocr": 1.5}  # Até haver throughput observado
+OCR_PAGE_BYTES = 8 * 1024 * 1024          # Página renderizada para OCR (150 DPI) + buffers do Tesseract
+THROUGHPUT_SMOOTHING = 0.3                # Peso de cada lote observado na média móvel
+
+
+class BatchPolicy:
+    """
+    Dimensiona os lotes pelo custo estimado de cada arquivo em vez de uma
+    quantidade fixa: um lote fecha quando a duração estimada passaria de
+    `target_seconds` ou a memória estimada passaria de `max_bytes`
+
+    O custo vem da pré-varredura da ingestão ("pages" e "text_layer" nos
+    metadados, ver core.ocr.prescan_pdf) e do tamanho em bytes; o tempo por
+    página (camada de texto ou OCR) é ajustado pelo throughput observado nos
+    lotes concluídos. Sem pré-varredura, o arquivo é tratado como escaneado.
+    """
+
+    def __init__(self, target_seconds: float = DEFAULT_TARGET_SECONDS,
+                 max_bytes: int = DEFAULT_MAX_BATCH_BYTES, workers: Optional[int] = None,
+                 max_pages: int = 2, min_size: int = MIN_BATCH_SIZE, max_size: int = MAX_BATCH_SIZE):
+        """
+        Args:
+            target_seconds: Duração alvo de um lote no worker
+            max_bytes: Memória estimada máxima de um lote (PDFs + páginas renderizadas)
+            workers: Processos do worker em paralelo (default: informado a cada
+                     group(), ex.: pelos workers ativos; sem isso, os núcleos locais)
+            max_pages: Páginas extraídas por arquivo (max_pages das opções de extração)
+            min_size: Arquivos mínimos por lote (mesmo acima das metas)
+            max_size: Arquivos máximos por lote (mesmo abaixo das metas)
+        """
+        self.target_seconds = target_seconds
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.max_pages = max_pages
+        self.min_size = min_size
+        self.max_size = max_size
+        self.page_seconds = dict(DEFAULT_PAGE_SECONDS)
+
+    def estimate(self, file_meta: Dict[str, Any]) -> Tuple[float, int]:
+        """
+        Custo estimado de um arquivo
+
+        Returns:
+            Tuple: (segundos de processamento, bytes de memória)
+        """
+        pages = min(file_meta.get("pages") or self.max_pages, self.max_pages)
+        kind = "text" if file_meta.get("text_layer") else "ocr"
+        memory = file_meta.get("size", 0) + (pages * OCR_PAGE_BYTES if kind == "ocr" else 0)
+        return pages * self.page_seconds[kind], memory
+
+    def group(self, files: Iterable[Dict[str, Any]],
+              workers: Optional[int] = None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Agrupa os arquivos em lotes na ordem recebida, de forma preguiçosa:
+        cada lote é gerado assim que o arquivo seguinte não couber nele
+
+        Args:
+            files: Metadados dos arquivos
+            workers: Processos do worker que vai executar os lotes, quando a
+                     política não fixa `workers`
+        """
+        # Os arquivos de um lote são divididos entre os processos do worker
+        budget = self.target_seconds * (self.workers or workers or os.cpu_count() or 1)
+        group, seconds, memory = [], 0.0, 0
+        for file_meta in files:
+            file_seconds, file_memory = self.estimate(file_meta)
+            over = seconds + file_seconds > budget or memory + file_memory > self.max_bytes
+            if group and (len(group) >= self.max_size or (over and len(group) >= self.min_size)):
+                yield group
+                group, seconds, memory = [], 0.0, 0
+            group.append(file_meta)
+            seconds += file_seconds
+            memory += file_memory
+        if group:
+            yield group
+
+    def observe(self, results: Iterable[Dict[str, Any]]):
+        """
+        Ajusta o tempo por página com as estatísticas de extração de um lote
+        (média móvel por tipo de página; acertos de cache e duplicados são ignorados)
+        """
+        totals = {"text": [0.0, 0], "ocr": [0.0, 0]}
+        for result in results:
+            if result.get("duplicate_of"):
+                continue
+            for page in (result.get("stats") or {}).get("pages", ()):
+                if "seconds" in page and not page.get("blank"):
+                    total = totals["ocr" if page.get("ocr") else "text"]
+                    total[0] += page["seconds"]
+                    total[1] += 1
+        for kind, (seconds, count) in totals.items():
+            if count:
+                self.page_seconds[kind] += THROUGHPUT_SMOOTHING * (seconds / count - self.page_seconds[kind])
+
 
 class BatchManager:
     """Gerencia a divisão e processamento de PDFs em lotes"""
     
-    def __init__(self, batch_size=50, storage_path="data/batches.json"):
+    def __init__(self, batch_size: Optional[int] = None, storage_path=DEFAULT_STORE_PATH,
+                 store: Optional[BatchStore] = None, journal: Optional[Dict[str, Any]] = None,
+                 policy: Optional[BatchPolicy] = None):
+        """
+        Args:
+            batch_size: Arquivos por lote (tamanho manual); None dimensiona os
+                        lotes automaticamente pela `policy`
+            storage_path: Arquivo de armazenamento; ".json" usa o formato legado,
+                          qualquer outra extensão usa SQLite (WAL)
+            store: Backend já construído (substitui storage_path)
+            journal: Com storage_path ".json", ativa o journal com gravação agrupada
+                     (ex.: {"flush_every": 100, "flush_interval_ms": 500}; ver JournaledBatchStore)
+            policy: Política de dimensionamento automático (default: BatchPolicy())
+        """
         self.batch_size = batch_size
+        self.policy = policy or BatchPolicy()
         self.storage_path = Path(storage_path)
-        self.storage_path.parent.mkdir(parents=True, exist_ok=True)
-        self.batches = self._load_batches()
-    
-    def _load_batches(self) -> Dict[str, Any]:
-        """Carrega lotes salvos do disco"""
-        if self.storage_path.exists():
-            try:
-                with open(self.storage_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except:
-                pass
-        return {}
-    
-    def _save_batches(self):
-        """Salva lotes no disco"""
-        with open(self.storage_path, 'w', encoding='utf-8') as f:
-            json.dump(self.batches, f, indent=2, ensure_ascii=False)
-    
-    def create_batches(self, files: List[Dict[str, Any]], doc_type: str, pattern: str) -> List[str]:
+        self.store = store or create_batch_store(self.storage_path, journal)
+        self._observed_until: Optional[str] = None  # updated_at do último lote observado pela política
+    
+    @property
+    def batches(self) -> Dict[str, Any]:
+        """Todos os lotes (lidos do backend)"""
+        return self.store.all()
+    
+    def _groups(self, files: Iterable[Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+        """Divide os arquivos pelo tamanho manual ou pela política automática"""
+        if not self.batch_size:
+            self.learn_throughput()
+            yield from self.policy.group(files, self.worker_processes())
+            return
+        group = []
+        for file_meta in files:
+            group.append(file_meta)
+            if len(group) >= self.batch_size:
+                yield group
+                group = []
+        if group:
+            yield group
+    
+    def learn_throughput(self, recent: int = 20):
+        """
+        Alimenta a política com os lotes concluídos desde a última chamada
+        (no máximo os `recent` mais recentes; cada lote é observado uma vez)
+        """
+        for batch in self.store.completed_since(self._observed_until, recent):
+            self.policy.observe(batch["results"])
+            self._observed_until = batch["updated_at"]
+    
+    def worker_processes(self) -> Optional[int]:
+        """
+        Processos por worker anunciados pelos workers ativos (o menor, para que
+        nenhum lote passe da duração alvo) ou None se nenhum estiver ativo
+        """
+        processes = [worker["processes"] for worker in self.active_workers() if worker.get("processes")]
+        return min(processes) if processes else None
+    
+    def create_batches(self, files: List[Dict[str, Any]], doc_type: str, pattern: str,
+                       job_id: Optional[str] = None, start_index: int = 0) -> List[str]:
         """
         Divide lista de arquivos em lotes
         
@@ -40,78 +185,191 @@ class BatchManager:
             files: Lista de dicionários com informações dos arquivos (sem conteúdo binário no JSON)
             doc_type: Tipo de documento
             pattern: Padrão de nomenclatura
+            job_id: Job ao qual os lotes pertencem (default: um novo job)
+            start_index: Posição do primeiro arquivo no job (campo "index")
         
         Returns:
             List[str]: Lista de IDs dos lotes criados
         """
-        batch_ids = []
-        total_files = len(files)
+        new_batches = []
+        job_id = job_id or new_job_id()  # Identifica os lotes criados juntos (exportação do job)
         
         # Dividir arquivos em lotes
-        for i in range(0, total_files, self.batch_size):
-            batch_files = files[i:i + self.batch_size]
-            batch_id = str(uuid.uuid4())[:8]
-            
-            # Criar metadados dos arquivos (sem conteúdo binário)
-            files_metadata = [{"name": f["name"], "index": idx + i} for idx, f in enumerate(batch_files)]
-            
-            batch_data = {
-                "id": batch_id,
-                "status": "pending",  # pending, processing, completed, failed
-                "created_at": datetime.now().isoformat(),
-                "updated_at": datetime.now().isoformat(),
-                "total_files": len(batch_files),
-                "processed_files": 0,
-                "failed_files": 0,
-                "doc_type": doc_type,
-                "pattern": pattern,
-                "files": files_metadata,  # Apenas metadados
-                "results": [],
-                "errors": []
-            }
-            
-            self.batches[batch_id] = batch_data
-            batch_ids.append(batch_id)
+        for batch_files in self._groups(files):
+            new_batches.append(self._new_batch(batch_files, doc_type, pattern, job_id, start_index))
+            start_index += len(batch_files)
+        
+        self.store.insert_batches(new_batches)
+        return [batch["id"] for batch in new_batches]
+    
+    @staticmethod
+    def _new_batch(batch_files: List[Dict[str, Any]], doc_type: str, pattern: str,
+                   job_id: str, start_index: int) -> Dict[str, Any]:
+        """Monta os dados de um lote "pending" (sem conteúdo binário)"""
+        files_metadata = []
+        for idx, f in enumerate(batch_files):
+            file_meta = {"name": f["name"], "index": start_index + idx}
+            if "sha256" in f:
+                file_meta["sha256"] = f["sha256"]  # Chave do conteúdo (deduplicação / UploadStore)
+            # Tamanho e pré-varredura (custo estimado pela BatchPolicy)
+            for key in ("size", "pages", "text_layer"):
+                if key in f:
+                    file_meta[key] = f[key]
+            files_metadata.append(file_meta)
+        
+        return {
+            "id": str(uuid.uuid4())[:8],
+            "job_id": job_id,
+            "status": "pending",  # pending, processing, completed, failed
+            "created_at": datetime.now().isoformat(),
+            "updated_at": datetime.now().isoformat(),
+            "total_files": len(batch_files),
+            "processed_files": 0,
+            "failed_files": 0,
+            "doc_type": doc_type,
+            "pattern": pattern,
+            "files": files_metadata,  # Apenas metadados
+            "results": [],
+            "errors": []
+        }
+    
+    def create_batches_streaming(self, files: Iterable[Dict[str, Any]], doc_type: str, pattern: str,
+                                 max_pending: Optional[int] = None,
+                                 poll_interval: float = 1.0) -> Iterator[str]:
+        """
+        Cria os lotes de um job à medida que os arquivos chegam (ex.: core.ingest)
+        
+        Cada lote é gravado como "pending" assim que fica completo (batch_size
+        arquivos ou as metas da política automática), então o worker começa a
+        processar enquanto o restante ainda está sendo lido.
+        
+        Args:
+            files: Iterável (preguiçoso) de metadados {"name", "sha256", "size"}
+                   e, com pré-varredura, "pages" e "text_layer"
+            max_pending: Limite de lotes do job aguardando o worker; ao atingi-lo
+                         a leitura de novos arquivos espera (back-pressure) enquanto
+                         houver worker ativo - sem worker, os lotes só se acumulam
+            poll_interval: Intervalo entre verificações do limite, em segundos
         
-        self._save_batches()
-        return batch_ids
+        Yields:
+            str: ID de cada lote criado
+        """
+        job_id = new_job_id()
+        created = []
+        start_index = 0
+        
+        def throttled():
+            # Depois de cada lote criado, só lê o próximo arquivo abaixo do limite
+            source = iter(files)
+            checked = 0
+            while True:
+                if max_pending and len(created) > checked:
+                    while (self._count_pending(created) >= max_pending
+                           and self.store.active_workers()):
+                        time.sleep(poll_interval)
+                    checked = len(created)
+                try:
+                    yield next(source)
+                except StopIteration:
+                    return
+        
+        for group in self._groups(throttled()):
+            batch = self._new_batch(group, doc_type, pattern, job_id, start_index)
+            self.store.insert_batches([batch])
+            created.append(batch["id"])
+            yield batch["id"]
+            start_index += len(group)
+    
+    def _count_pending(self, batch_ids: List[str]) -> int:
+        return sum(1 for batch_id in batch_ids if self.get_batch(batch_id).get("status") == "pending")
     
     def get_batch(self, batch_id: str) -> Dict[str, Any]:
         """Retorna informações de um lote específico"""
-        return self.batches.get(batch_id, {})
+        return self.store.get(batch_id) or {}
     
     def get_all_batches(self) -> Dict[str, Any]:
         """Retorna todos os lotes"""
-        return self.batches
+        return self.store.all()
     
     def update_batch_status(self, batch_id: str, status: str):
         """Atualiza o status de um lote"""
-        if batch_id in self.batches:
-            self.batches[batch_id]["status"] = status
-            self.batches[batch_id]["updated_at"] = datetime.now().isoformat()
-            self._save_batches()
+        self.store.update_status(batch_id, status, datetime.now().isoformat())
     
     def add_batch_result(self, batch_id: str, result: Dict[str, Any]):
         """Adiciona resultado de processamento ao lote (sem conteúdo binário)"""
-        if batch_id in self.batches:
-            # Salvar apenas metadados, não o conteúdo binário
-            result_metadata = {
-                "original": result.get("original"),
-                "novo": result.get("novo"),
-                "timestamp": datetime.now().isoformat()
-            }
-            self.batches[batch_id]["results"].append(result_metadata)
-            self.batches[batch_id]["processed_files"] = len(self.batches[batch_id]["results"])
-            self.batches[batch_id]["updated_at"] = datetime.now().isoformat()
-            self._save_batches()
+        # Salvar apenas metadados, não o conteúdo binário
+        now = datetime.now().isoformat()
+        result_metadata = {
+            "original": result.get("original"),
+            "novo": result.get("novo"),
+            "timestamp": now
+        }
+        # Estatísticas da extração (páginas com OCR, tempo por página)
+        if result.get("stats"):
+            result_metadata["stats"] = result["stats"]
+        if result.get("duplicate_of"):
+            result_metadata["duplicate_of"] = result["duplicate_of"]
+        self.store.append_result(batch_id, result_metadata, now)
     
     def add_batch_error(self, batch_id: str, error: Dict[str, Any]):
         """Adiciona erro de processamento ao lote"""
-        if batch_id in self.batches:
-            self.batches[batch_id]["errors"].append(error)
-            self.batches[batch_id]["failed_files"] += 1
-            self.batches[batch_id]["updated_at"] = datetime.now().isoformat()
-            self._save_batches()
+        self.store.append_error(batch_id, error, datetime.now().isoformat())
+    
+    def claim_batch(self, worker_id: str, lease_seconds: float) -> Optional[str]:
+        """Reserva o próximo lote pendente (ou com lease vencido) para um worker"""
+        return self.store.claim_batch(worker_id, lease_seconds)
+    
+    def renew_lease(self, batch_id: str, worker_id: str, lease_seconds: float) -> bool:
+        """Heartbeat do worker; False se o lote foi assumido por outro worker"""
+        return self.store.renew_lease(batch_id, worker_id, lease_seconds)
+    
+    def release_batch(self, batch_id: str, worker_id: str, status: str) -> bool:
+        """Libera o lease do worker definindo o status final do lote"""
+        return self.store.release_batch(batch_id, worker_id, status)
+    
+    def register_worker(self, worker_id: str, info: Dict[str, Any], ttl: float):
+        """Anuncia um worker ativo por `ttl` segundos (ver BatchWorker)"""
+        self.store.register_worker(worker_id, info, ttl)
+    
+    def unregister_worker(self, worker_id: str):
+        """Remove o anúncio de um worker encerrado"""
+        self.store.unregister_worker(worker_id)
+    
+    def active_workers(self) -> List[Dict[str, Any]]:
+        """Workers ativos (anúncio dentro do prazo), com "processes" de cada um"""
+        return self.store.active_workers()
+    
+    def pending_files(self, batch_id: str) -> List[Dict[str, Any]]:
+        """Arquivos do lote ainda sem resultado nem erro registrado (ponto de retomada)"""
+        batch = self.get_batch(batch_id)
+        if not batch:
+            return []
+        done = {r.get("original") for r in batch["results"]} | {e.get("file") for e in batch["errors"]}
+        return [f for f in batch["files"] if f["name"] not in done]
+    
+    def resume_batch(self, batch_id: str) -> bool:
+        """
+        Devolve à fila um lote interrompido ("processing" sem worker ativo ou
+        "failed"); o worker continua a partir do primeiro arquivo pendente
+        
+        Returns:
+            bool: True se o lote voltou para a fila
+        """
+        return self.store.requeue_batch(batch_id)
+    
+    def resume_interrupted(self) -> List[str]:
+        """Devolve à fila todos os lotes "processing" sem lease ativo (ex.: após uma queda)"""
+        return [batch_id for batch_id, batch in self.store.all().items()
+                if batch["status"] == "processing" and self.store.requeue_batch(batch_id)]
+    
+    def content_refs(self) -> Dict[str, int]:
+        """Contagem de referências por sha256 nos lotes existentes (despejo do UploadStore)"""
+        refs: Dict[str, int] = {}
+        for batch in self.store.all().values():
+            for f in batch["files"]:
+                if "sha256" in f:
+                    refs[f["sha256"]] = refs.get(f["sha256"], 0) + 1
+        return refs
     
     def get_progress(self, batch_id: str) -> float:
         """Calcula o progresso de um lote (0.0 a 1.0)"""
@@ -127,17 +385,13 @@ class BatchManager:
         current_time = datetime.now()
         to_remove = []
         
-        for batch_id, batch_data in self.batches.items():
+        for batch_id, batch_data in self.store.all().items():
             if batch_data["status"] == "completed":
                 updated_at = datetime.fromisoformat(batch_data["updated_at"])
                 days_old = (current_time - updated_at).days
                 if days_old > 7:
                     to_remove.append(batch_id)
         
-        for batch_id in to_remove:
-            del self.batches[batch_id]
-        
-        if to_remove:
-            self._save_batches()
+        self.store.delete(to_remove)
         
         return len(to_remove)
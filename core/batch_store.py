@@ -0,0 +1,758 @@
+"""
+Backends de armazenamento dos lotes do BatchManager
+- SQLiteBatchStore (padrão): SQLite em modo WAL, uma linha por resultado/erro,
+  contadores atualizados na mesma transação e leitores concorrentes
+- JSONBatchStore: arquivo JSON único (formato legado), gravado de forma atômica
+- JournaledBatchStore: snapshot JSON + journal por lote, com gravação agrupada
+
+Os backends JSON carregam o arquivo uma vez e mantêm os lotes em memória: só
+servem a um único processo. Interface e worker (main.py) separados exigem o SQLite.
+"""
+import atexit
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+
+DEFAULT_STORE_PATH = "data/batches.sqlite"
+LEGACY_JSON_PATH = "data/batches.json"
+
+# Campos escalares de um lote (colunas da tabela batches)
+BATCH_COLUMNS = ("id", "status", "created_at", "updated_at", "total_files",
+                 "processed_files", "failed_files", "doc_type", "pattern",
+                 "lease_owner", "lease_expires")
+
+
+class BatchStore(ABC):
+    """Interface dos backends: cada lote é um dicionário no formato do BatchManager"""
+
+    @abstractmethod
+    def get(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """Retorna o lote completo (com files, results e errors) ou None"""
+
+    @abstractmethod
+    def all(self) -> Dict[str, Dict[str, Any]]:
+        """Retorna todos os lotes, na ordem de criação"""
+
+    @abstractmethod
+    def insert_batches(self, batches: List[Dict[str, Any]]):
+        """Grava novos lotes"""
+
+    @abstractmethod
+    def update_status(self, batch_id: str, status: str, updated_at: str) -> bool:
+        """Atualiza o status; retorna False se o lote não existir"""
+
+    @abstractmethod
+    def append_result(self, batch_id: str, result: Dict[str, Any], updated_at: str) -> bool:
+        """Acrescenta um resultado e incrementa processed_files"""
+
+    @abstractmethod
+    def append_error(self, batch_id: str, error: Dict[str, Any], updated_at: str) -> bool:
+        """Acrescenta um erro e incrementa failed_files"""
+
+    @abstractmethod
+    def delete(self, batch_ids: List[str]):
+        """Remove lotes"""
+
+    @abstractmethod
+    def claim_batch(self, worker_id: str, lease_seconds: float) -> Optional[str]:
+        """
+        Reserva o próximo lote "pending" (ou "processing" com lease vencido)
+        para um worker, marcando-o como "processing"
+
+        Returns:
+            str: ID do lote reservado ou None se não houver trabalho
+        """
+
+    @abstractmethod
+    def renew_lease(self, batch_id: str, worker_id: str, lease_seconds: float) -> bool:
+        """Heartbeat: prolonga o lease; retorna False se o worker perdeu o lote"""
+
+    @abstractmethod
+    def release_batch(self, batch_id: str, worker_id: str, status: str) -> bool:
+        """Encerra o lease do worker e define o status final do lote"""
+
+    @abstractmethod
+    def requeue_batch(self, batch_id: str) -> bool:
+        """
+        Devolve à fila ("pending") um lote "processing" ou "failed" sem lease
+        ativo, mantendo os resultados já registrados; False se não for possível
+        """
+
+    @abstractmethod
+    def completed_since(self, updated_after: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        """
+        Lotes "completed" com updated_at posterior a `updated_after` (None: todos),
+        apenas os `limit` mais recentes, em ordem cronológica
+        """
+
+    @abstractmethod
+    def register_worker(self, worker_id: str, info: Dict[str, Any], ttl: float):
+        """Anuncia (ou renova) um worker ativo por `ttl` segundos, com seus dados (ex.: processos)"""
+
+    @abstractmethod
+    def unregister_worker(self, worker_id: str):
+        """Remove o anúncio de um worker encerrado"""
+
+    @abstractmethod
+    def active_workers(self) -> List[Dict[str, Any]]:
+        """Workers com anúncio válido: {"id", "expires", **info}"""
+
+    def close(self):
+        """Libera recursos do backend"""
+
+
+def _stale_before(lease_seconds: float) -> str:
+    """updated_at limite para lotes "processing" sem lease (processados pela interface)"""
+    return (datetime.now() - timedelta(seconds=lease_seconds)).isoformat()
+
+
+def _set_aside(path: Path) -> Path:
+    """Renomeia um arquivo ilegível para <nome>.corrupt em vez de sobrescrevê-lo"""
+    target = path.with_name(path.name + ".corrupt")
+    os.replace(path, target)
+    return target
+
+
+def read_json_batches(path) -> Dict[str, Any]:
+    """
+    Lê um arquivo de lotes no formato JSON
+
+    Um arquivo corrompido é preservado como <nome>.corrupt e tratado como vazio,
+    para que a próxima gravação não destrua o que ainda puder ser recuperado.
+    """
+    path = Path(path)
+    if not path.exists():
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (ValueError, UnicodeDecodeError):
+        _set_aside(path)
+        return {}
+
+
+class JSONBatchStore(BatchStore):
+    """
+    Todos os lotes em um único arquivo JSON, regravado a cada alteração
+
+    Apenas um processo: o arquivo é lido só na abertura, então lotes gravados
+    por outro processo não aparecem e cada gravação sobrescreve os dele.
+    """
+
+    def __init__(self, path=LEGACY_JSON_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.batches = read_json_batches(self.path)
+        # Anúncios dos workers só em memória: o JSON já é de um único processo
+        self.workers: Dict[str, Dict[str, Any]] = {}
+
+    def _save(self):
+        """Grava em arquivo temporário e troca de forma atômica (sem arquivo pela metade)"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.batches, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _status_changed(self, batch_id):
+        """Persiste status e lease de um lote após claim/release/requeue/update_status"""
+        self._save()
+
+    def get(self, batch_id):
+        return self.batches.get(batch_id)
+
+    def all(self):
+        return self.batches
+
+    def insert_batches(self, batches):
+        for batch in batches:
+            self.batches[batch["id"]] = batch
+        self._save()
+
+    def update_status(self, batch_id, status, updated_at):
+        if batch_id not in self.batches:
+            return False
+        self.batches[batch_id]["status"] = status
+        self.batches[batch_id]["updated_at"] = updated_at
+        self._status_changed(batch_id)
+        return True
+
+    def append_result(self, batch_id, result, updated_at):
+        if batch_id not in self.batches:
+            return False
+        batch = self.batches[batch_id]
+        batch["results"].append(result)
+        batch["processed_files"] = len(batch["results"])
+        batch["updated_at"] = updated_at
+        self._save()
+        return True
+
+    def append_error(self, batch_id, error, updated_at):
+        if batch_id not in self.batches:
+            return False
+        batch = self.batches[batch_id]
+        batch["errors"].append(error)
+        batch["failed_files"] += 1
+        batch["updated_at"] = updated_at
+        self._save()
+        return True
+
+    def delete(self, batch_ids):
+        for batch_id in batch_ids:
+            self.batches.pop(batch_id, None)
+        if batch_ids:
+            self._save()
+
+    def claim_batch(self, worker_id, lease_seconds):
+        # Sem coordenação entre processos: adequado a um único worker
+        now = time.time()
+        stale = _stale_before(lease_seconds)
+        for batch_id, batch in self.batches.items():
+            expires = batch.get("lease_expires")
+            claimable = batch["status"] == "pending" or batch["status"] == "processing" and (
+                expires < now if expires is not None else batch["updated_at"] < stale
+            )
+            if claimable:
+                batch.update(status="processing", lease_owner=worker_id,
+                             lease_expires=now + lease_seconds,
+                             updated_at=datetime.now().isoformat())
+                self._status_changed(batch_id)
+                return batch_id
+        return None
+
+    def renew_lease(self, batch_id, worker_id, lease_seconds):
+        batch = self.batches.get(batch_id)
+        if not batch or batch.get("lease_owner") != worker_id:
+            return False
+        batch["lease_expires"] = time.time() + lease_seconds
+        return True
+
+    def release_batch(self, batch_id, worker_id, status):
+        batch = self.batches.get(batch_id)
+        if not batch or batch.get("lease_owner") != worker_id:
+            return False
+        batch.update(status=status, lease_owner=None, lease_expires=None,
+                     updated_at=datetime.now().isoformat())
+        self._status_changed(batch_id)
+        return True
+
+    def completed_since(self, updated_after, limit):
+        completed = sorted(
+            (batch for batch in self.batches.values()
+             if batch.get("status") == "completed" and batch.get("updated_at", "") > (updated_after or "")),
+            key=lambda batch: batch.get("updated_at", "")
+        )
+        return completed[-limit:] if limit else []
+
+    def register_worker(self, worker_id, info, ttl):
+        self.workers[worker_id] = {**info, "id": worker_id, "expires": time.time() + ttl}
+
+    def unregister_worker(self, worker_id):
+        self.workers.pop(worker_id, None)
+
+    def active_workers(self):
+        now = time.time()
+        return [worker for worker in self.workers.values() if worker["expires"] >= now]
+
+    def requeue_batch(self, batch_id):
+        batch = self.batches.get(batch_id)
+        expires = batch.get("lease_expires") if batch else None
+        if not batch or batch["status"] not in ("processing", "failed") or (
+                expires is not None and expires >= time.time()):
+            return False
+        batch.update(status="pending", lease_owner=None, lease_expires=None,
+                     updated_at=datetime.now().isoformat())
+        self._status_changed(batch_id)
+        return True
+
+
+class JournaledBatchStore(JSONBatchStore):
+    """
+    JSON com journal: o snapshot é o mesmo arquivo do JSONBatchStore e cada
+    resultado, erro ou mudança de status vira uma linha JSON compacta no
+    journal do lote (<arquivo>.journal/<lote>.jsonl)
+
+    As linhas ficam em buffer e são gravadas a cada `flush_every` registros ou
+    `flush_interval_ms` milissegundos, o que vier primeiro; uma queda perde no
+    máximo esse intervalo. A cada `snapshot_every` registros o snapshot é
+    regravado e os journals são apagados. Na abertura, snapshot + journals são
+    reaplicados.
+    """
+
+    def __init__(self, path=LEGACY_JSON_PATH, flush_every=100, flush_interval_ms=500,
+                 snapshot_every=5000, fsync=False):
+        """
+        Args:
+            path: Arquivo do snapshot (formato do JSONBatchStore)
+            flush_every: Registros em buffer que disparam a gravação (1 = sem perda)
+            flush_interval_ms: Tempo máximo de um registro em buffer
+            snapshot_every: Registros no journal que disparam a compactação
+            fsync: Força a escrita no disco a cada gravação do journal
+        """
+        super().__init__(path)
+        self.journal_dir = self.path.with_name(self.path.name + ".journal")
+        self.journal_dir.mkdir(exist_ok=True)
+        self.flush_every = max(1, flush_every)
+        self.flush_interval = flush_interval_ms / 1000
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self._buffer: List[Tuple[str, str]] = []  # (lote, linha JSON)
+        self._journaled = 0  # Registros no journal desde o último snapshot
+        self._lock = threading.RLock()
+        self._timer = None
+        self._replay()
+        atexit.register(self.close)
+
+    def _journal_path(self, batch_id: str) -> Path:
+        return self.journal_dir / f"{batch_id}.jsonl"
+
+    def _replay(self):
+        """Reaplica os journals sobre o snapshot carregado"""
+        for journal in sorted(self.journal_dir.glob("*.jsonl")):
+            batch = self.batches.get(journal.stem)
+            with open(journal, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # Última linha incompleta (queda durante a gravação)
+                    if batch is not None:
+                        self._apply(batch, record)
+                    self._journaled += 1
+        if self._journaled:
+            self.compact()
+
+    @staticmethod
+    def _apply(batch, record):
+        """
+        Aplica um registro do journal; resultados e erros carregam a posição
+        ("n") para que um journal já incluído no snapshot não seja duplicado
+        """
+        kind = record["k"]
+        if kind == "s":
+            batch["status"] = record["s"]
+            if "o" in record:  # Lease (claim/release/requeue)
+                batch["lease_owner"] = record["o"]
+                batch["lease_expires"] = record["x"]
+        elif len(batch["results"]) + len(batch["errors"]) < record["n"]:
+            if kind == "r":
+                batch["results"].append(record["d"])
+                batch["processed_files"] = len(batch["results"])
+            else:
+                batch["errors"].append(record["d"])
+                batch["failed_files"] += 1
+        batch["updated_at"] = record["u"]
+
+    def _log(self, batch_id, record):
+        with self._lock:
+            self._buffer.append((batch_id, json.dumps(record, ensure_ascii=False, separators=(",", ":"))))
+            if len(self._buffer) >= self.flush_every:
+                self.flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+            if self._journaled + len(self._buffer) >= self.snapshot_every:
+                self.compact()
+
+    def flush(self):
+        """Grava os registros em buffer no journal de cada lote"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._buffer:
+                return
+            lines: Dict[str, List[str]] = {}
+            for batch_id, line in self._buffer:
+                lines.setdefault(batch_id, []).append(line)
+            for batch_id, batch_lines in lines.items():
+                with open(self._journal_path(batch_id), 'a', encoding='utf-8') as f:
+                    f.write("\n".join(batch_lines) + "\n")
+                    if self.fsync:
+                        f.flush()
+                        os.fsync(f.fileno())
+            self._journaled += len(self._buffer)
+            self._buffer.clear()
+
+    def compact(self):
+        """Regrava o snapshot com o estado atual e descarta os journals"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._buffer.clear()  # O snapshot já contém tudo o que estava em buffer
+            self._save()
+            for journal in self.journal_dir.glob("*.jsonl"):
+                journal.unlink()
+            self._journaled = 0
+
+    def _status_changed(self, batch_id):
+        # Status e lease vão para o journal como os resultados: regravar só o
+        # snapshot deixaria registros "s" antigos no journal, reaplicados por cima dele
+        batch = self.batches[batch_id]
+        self._log(batch_id, {"k": "s", "s": batch["status"], "u": batch["updated_at"],
+                             "o": batch.get("lease_owner"), "x": batch.get("lease_expires")})
+
+    def claim_batch(self, worker_id, lease_seconds):
+        with self._lock:
+            return super().claim_batch(worker_id, lease_seconds)
+
+    def release_batch(self, batch_id, worker_id, status):
+        with self._lock:
+            return super().release_batch(batch_id, worker_id, status)
+
+    def requeue_batch(self, batch_id):
+        with self._lock:
+            return super().requeue_batch(batch_id)
+
+    def _append(self, kind, batch_id, item, updated_at):
+        batch = self.batches.get(batch_id)
+        if batch is None:
+            return False
+        record = {"k": kind, "d": item, "u": updated_at,
+                  "n": len(batch["results"]) + len(batch["errors"]) + 1}
+        self._apply(batch, record)
+        self._log(batch_id, record)
+        return True
+
+    def append_result(self, batch_id, result, updated_at):
+        return self._append("r", batch_id, result, updated_at)
+
+    def append_error(self, batch_id, error, updated_at):
+        return self._append("e", batch_id, error, updated_at)
+
+    def insert_batches(self, batches):
+        with self._lock:
+            for batch in batches:
+                self.batches[batch["id"]] = batch
+            self.compact()
+
+    def delete(self, batch_ids):
+        with self._lock:
+            for batch_id in batch_ids:
+                self.batches.pop(batch_id, None)
+            if batch_ids:
+                self.compact()
+
+    def close(self):
+        """Grava o que estiver em buffer e compacta"""
+        with self._lock:
+            if self._buffer or self._journaled:
+                self.compact()
+
+
+class SQLiteBatchStore(BatchStore):
+    """
+    Lotes em SQLite (modo WAL)
+
+    Cada resultado ou erro é uma linha nova; os contadores do lote são
+    atualizados na mesma transação. Leitores (ex.: a interface acompanhando o
+    progresso) não bloqueiam o processo que grava.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH, migrate_from: Optional[str] = None):
+        """
+        Args:
+            path: Arquivo SQLite
+            migrate_from: Arquivo JSON legado importado se o banco estiver vazio;
+                          se tiver lotes, é renomeado para <nome>.migrated após a importação
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()  # Uma conexão por thread (ex.: heartbeat do worker)
+        if migrate_from:
+            self.migrate_json(migrate_from)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Abre (ou reabre após fork) a conexão da thread atual"""
+        if getattr(self._local, "conn", None) is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            # Esquema criado/migrado numa transação exclusiva: app e worker abrindo
+            # um banco novo ao mesmo tempo não repetem o ALTER TABLE
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS batches (
+                        id TEXT PRIMARY KEY,
+                        status TEXT NOT NULL,
+                        created_at TEXT NOT NULL,
+                        updated_at TEXT NOT NULL,
+                        total_files INTEGER NOT NULL,
+                        processed_files INTEGER NOT NULL DEFAULT 0,
+                        failed_files INTEGER NOT NULL DEFAULT 0,
+                        doc_type TEXT,
+                        pattern TEXT,
+                        files TEXT NOT NULL,
+                        extra TEXT,
+                        lease_owner TEXT,
+                        lease_expires REAL
+                    )
+                """)
+                for table in ("results", "errors"):
+                    conn.execute(f"""
+                        CREATE TABLE IF NOT EXISTS {table} (
+                            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                            batch_id TEXT NOT NULL REFERENCES batches(id) ON DELETE CASCADE,
+                            data TEXT NOT NULL
+                        )
+                    """)
+                    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_batch ON {table}(batch_id, seq)")
+                columns = {row[1] for row in conn.execute("PRAGMA table_info(batches)")}
+                if "lease_owner" not in columns:
+                    # Leases dos workers (bancos criados antes do worker não têm as colunas)
+                    conn.execute("ALTER TABLE batches ADD COLUMN lease_owner TEXT")
+                    conn.execute("ALTER TABLE batches ADD COLUMN lease_expires REAL")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_batches_status ON batches(status)")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS workers (
+                        id TEXT PRIMARY KEY,
+                        info TEXT NOT NULL,
+                        expires REAL NOT NULL
+                    )
+                """)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    def _row_to_batch(self, conn, row) -> Dict[str, Any]:
+        batch = dict(zip(BATCH_COLUMNS, row[:len(BATCH_COLUMNS)]))
+        batch["files"] = json.loads(row[len(BATCH_COLUMNS)])
+        if row[-1]:
+            batch.update(json.loads(row[-1]))
+        for table in ("results", "errors"):
+            batch[table] = [
+                json.loads(data) for (data,) in conn.execute(
+                    f"SELECT data FROM {table} WHERE batch_id = ? ORDER BY seq", (batch["id"],)
+                )
+            ]
+        return batch
+
+    def get(self, batch_id):
+        conn = self._connect()
+        # Leitura consistente: lote e linhas vistos no mesmo instante
+        with conn:
+            conn.execute("BEGIN")
+            row = conn.execute(
+                f"SELECT {', '.join(BATCH_COLUMNS)}, files, extra FROM batches WHERE id = ?",
+                (batch_id,)
+            ).fetchone()
+            return self._row_to_batch(conn, row) if row else None
+
+    def all(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN")
+            rows = conn.execute(
+                f"SELECT {', '.join(BATCH_COLUMNS)}, files, extra FROM batches ORDER BY rowid"
+            ).fetchall()
+            return {row[0]: self._row_to_batch(conn, row) for row in rows}
+
+    def insert_batches(self, batches):
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for batch in batches:
+                self._insert(conn, batch)
+
+    @staticmethod
+    def _insert(conn, batch):
+        # Chaves fora do esquema (ex.: adicionadas por versões futuras) vão para "extra"
+        extra = {k: v for k, v in batch.items()
+                 if k not in BATCH_COLUMNS and k not in ("files", "results", "errors")}
+        conn.execute(
+            f"INSERT OR REPLACE INTO batches ({', '.join(BATCH_COLUMNS)}, files, extra) "
+            f"VALUES ({', '.join('?' * (len(BATCH_COLUMNS) + 2))})",
+            tuple(batch.get(column, 0 if column.endswith("_files") else None)
+                  for column in BATCH_COLUMNS)
+            + (json.dumps(batch.get("files", []), ensure_ascii=False),
+               json.dumps(extra, ensure_ascii=False) if extra else None)
+        )
+        for table in ("results", "errors"):
+            conn.executemany(
+                f"INSERT INTO {table} (batch_id, data) VALUES (?, ?)",
+                [(batch["id"], json.dumps(item, ensure_ascii=False)) for item in batch.get(table, [])]
+            )
+
+    def update_status(self, batch_id, status, updated_at):
+        conn = self._connect()
+        cursor = conn.execute(
+            "UPDATE batches SET status = ?, updated_at = ? WHERE id = ?",
+            (status, updated_at, batch_id)
+        )
+        return cursor.rowcount > 0
+
+    def _append(self, table, counter, batch_id, item, updated_at):
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.execute(
+                f"UPDATE batches SET {counter} = {counter} + 1, updated_at = ? WHERE id = ?",
+                (updated_at, batch_id)
+            )
+            if cursor.rowcount == 0:
+                return False
+            conn.execute(
+                f"INSERT INTO {table} (batch_id, data) VALUES (?, ?)",
+                (batch_id, json.dumps(item, ensure_ascii=False))
+            )
+        return True
+
+    def append_result(self, batch_id, result, updated_at):
+        return self._append("results", "processed_files", batch_id, result, updated_at)
+
+    def append_error(self, batch_id, error, updated_at):
+        return self._append("errors", "failed_files", batch_id, error, updated_at)
+
+    def delete(self, batch_ids):
+        if not batch_ids:
+            return
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("DELETE FROM batches WHERE id = ?", [(bid,) for bid in batch_ids])
+
+    def migrate_json(self, json_path) -> int:
+        """
+        Importa os lotes de um arquivo JSON legado, se o banco ainda estiver vazio
+
+        Returns:
+            int: Número de lotes importados
+        """
+        json_path = Path(json_path)
+        if not json_path.exists():
+            return 0
+        conn = self._connect()
+        with conn:
+            # Verificação e importação na mesma transação exclusiva: interface e
+            # worker iniciados juntos não importam o arquivo duas vezes
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM batches LIMIT 1").fetchone():
+                return 0
+            batches = read_json_batches(json_path)
+            for batch_id, batch in batches.items():
+                self._insert(conn, {**batch, "id": batch.get("id", batch_id)})
+        if batches:
+            try:
+                os.replace(json_path, json_path.with_name(json_path.name + ".migrated"))
+            except FileNotFoundError:
+                pass  # Já renomeado por outro processo
+        return len(batches)
+
+    def claim_batch(self, worker_id, lease_seconds):
+        conn = self._connect()
+        now = time.time()
+        with conn:
+            # BEGIN IMMEDIATE: dois workers nunca reservam o mesmo lote
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                """
+                SELECT id FROM batches
+                WHERE status = 'pending'
+                   OR (status = 'processing' AND lease_expires IS NOT NULL AND lease_expires < ?)
+                   OR (status = 'processing' AND lease_expires IS NULL AND updated_at < ?)
+                ORDER BY rowid LIMIT 1
+                """,
+                (now, _stale_before(lease_seconds))
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE batches SET status = 'processing', lease_owner = ?, lease_expires = ?, "
+                "updated_at = ? WHERE id = ?",
+                (worker_id, now + lease_seconds, datetime.now().isoformat(), row[0])
+            )
+        return row[0]
+
+    def renew_lease(self, batch_id, worker_id, lease_seconds):
+        conn = self._connect()
+        cursor = conn.execute(
+            "UPDATE batches SET lease_expires = ? WHERE id = ? AND lease_owner = ?",
+            (time.time() + lease_seconds, batch_id, worker_id)
+        )
+        return cursor.rowcount > 0
+
+    def release_batch(self, batch_id, worker_id, status):
+        conn = self._connect()
+        cursor = conn.execute(
+            "UPDATE batches SET status = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+            "WHERE id = ? AND lease_owner = ?",
+            (status, datetime.now().isoformat(), batch_id, worker_id)
+        )
+        return cursor.rowcount > 0
+
+    def completed_since(self, updated_after, limit):
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN")
+            rows = conn.execute(
+                f"SELECT {', '.join(BATCH_COLUMNS)}, files, extra FROM batches "
+                "WHERE status = 'completed' AND updated_at > ? ORDER BY updated_at DESC LIMIT ?",
+                (updated_after or "", limit)
+            ).fetchall()
+            return [self._row_to_batch(conn, row) for row in reversed(rows)]
+
+    def register_worker(self, worker_id, info, ttl):
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO workers (id, info, expires) VALUES (?, ?, ?)",
+            (worker_id, json.dumps(info, ensure_ascii=False), time.time() + ttl)
+        )
+
+    def unregister_worker(self, worker_id):
+        self._connect().execute("DELETE FROM workers WHERE id = ?", (worker_id,))
+
+    def active_workers(self):
+        rows = self._connect().execute(
+            "SELECT id, info, expires FROM workers WHERE expires >= ? ORDER BY id", (time.time(),)
+        ).fetchall()
+        return [{**json.loads(info), "id": worker_id, "expires": expires}
+                for worker_id, info, expires in rows]
+
+    def requeue_batch(self, batch_id):
+        conn = self._connect()
+        cursor = conn.execute(
+            "UPDATE batches SET status = 'pending', lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+            "WHERE id = ? AND status IN ('processing', 'failed') "
+            "AND (lease_expires IS NULL OR lease_expires < ?)",
+            (datetime.now().isoformat(), batch_id, time.time())
+        )
+        return cursor.rowcount > 0
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+        self._local.conn = None
+
+
+def create_batch_store(path=DEFAULT_STORE_PATH, journal: Optional[Dict[str, Any]] = None) -> BatchStore:
+    """
+    Escolhe o backend pela extensão do arquivo: .json usa JSONBatchStore
+    (ou JournaledBatchStore quando `journal` é informado, com as opções de
+    flush/snapshot), qualquer outra usa SQLiteBatchStore (migrando o
+    data/batches.json legado que estiver na mesma pasta)
+
+    Os backends JSON são de um único processo; com o worker (main.py) rodando
+    à parte, use o SQLite.
+    """
+    path = Path(path)
+    if path.suffix == ".json":
+        if journal is not None:
+            return JournaledBatchStore(path, **journal)
+        return JSONBatchStore(path)
+    return SQLiteBatchStore(path, migrate_from=path.with_name(Path(LEGACY_JSON_PATH).name))
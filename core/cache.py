@@ -0,0 +1,152 @@
+"""
+Cache persistente de resultados de extração (OCR) endereçado por conteúdo
+Armazena em SQLite (modo WAL) para permitir acesso concorrente de vários processos
+"""
+import hashlib
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+
+DEFAULT_CACHE_PATH = "data/ocr_cache.sqlite"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024  # 256 MB
+
+
+class OCRCache:
+    """Cache em disco de texto extraído, com limite de tamanho e despejo LRU"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._conn = None
+        self._pid = None
+
+    @staticmethod
+    def make_key(pdf_content: bytes, **params) -> str:
+        """
+        Gera a chave do cache: hash do conteúdo do PDF + parâmetros de extração
+
+        Args:
+            pdf_content: Conteúdo do PDF em bytes
+            **params: Parâmetros que alteram o resultado (max_pages, dpi, idioma...)
+
+        Returns:
+            str: Chave hexadecimal (SHA-256)
+        """
+        digest = hashlib.sha256(pdf_content)
+        for name in sorted(params):
+            digest.update(f"\0{name}={params[name]!r}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Abre (ou reabre após fork) a conexão do processo atual"""
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # Esquema criado/migrado numa transação exclusiva: processos do pool
+            # abrindo um cache novo ao mesmo tempo não repetem o ALTER TABLE
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS entries (
+                        key TEXT PRIMARY KEY,
+                        text TEXT NOT NULL,
+                        size INTEGER NOT NULL,
+                        last_access REAL NOT NULL,
+                        normalized TEXT
+                    )
+                """)
+                columns = {row[1] for row in conn.execute("PRAGMA table_info(entries)")}
+                if "normalized" not in columns:
+                    # Texto normalizado guardado junto do texto bruto (caches antigos não têm a coluna)
+                    conn.execute("ALTER TABLE entries ADD COLUMN normalized TEXT")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_access ON entries(last_access)")
+                conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+                conn.execute("INSERT OR IGNORE INTO counters VALUES ('hits', 0), ('misses', 0)")
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        """Retorna o texto em cache (atualizando o acesso LRU) ou None"""
+        entry = self.get_entry(key)
+        return entry["text"] if entry else None
+
+    def get_entry(self, key: str) -> Optional[Dict[str, Optional[str]]]:
+        """
+        Retorna {"text": texto bruto, "normalized": texto normalizado ou None}
+        (atualizando o acesso LRU) ou None se não estiver em cache
+        """
+        conn = self._connect()
+        row = conn.execute("SELECT text, normalized FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            conn.execute("UPDATE counters SET value = value + 1 WHERE name = 'misses'")
+            return None
+        conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        conn.execute("UPDATE counters SET value = value + 1 WHERE name = 'hits'")
+        return {"text": row[0], "normalized": row[1]}
+
+    def put(self, key: str, text: str, normalized: Optional[str] = None):
+        """Armazena um resultado e despeja as entradas menos usadas se exceder o limite"""
+        conn = self._connect()
+        size = len(text.encode("utf-8"))
+        if normalized is not None:
+            size += len(normalized.encode("utf-8"))
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, text, normalized, size, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, text, normalized, size, time.time())
+            )
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                self._evict(conn, total - self.max_bytes)
+
+    def _evict(self, conn: sqlite3.Connection, excess: int):
+        """Remove as entradas acessadas há mais tempo até liberar `excess` bytes"""
+        freed = 0
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_access"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna contadores de acertos/falhas e ocupação do cache"""
+        conn = self._connect()
+        counters = dict(conn.execute("SELECT name, value FROM counters"))
+        entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "hits": counters["hits"],
+            "misses": counters["misses"],
+            "hit_rate": counters["hits"] / lookups if lookups else 0.0,
+            "entries": entries,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes
+        }
+
+    def clear(self):
+        """Remove todas as entradas e zera os contadores"""
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM entries")
+            conn.execute("UPDATE counters SET value = 0")
+
+
+_default_cache = None
+
+
+def get_default_cache() -> OCRCache:
+    """Retorna o cache padrão do processo (criado sob demanda)"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = OCRCache()
+    return _default_cache
@@ -0,0 +1,113 @@
+"""
+Classificação automática do tipo de documento a partir do texto extraído
+Pontua o texto contra todos os templates registrados numa única varredura de termos-âncora
+"""
+import re
+from collections import Counter
+from typing import Dict, Any, Iterable
+
+from core.parser import REGISTRY
+
+try:
+    import ahocorasick  # pyahocorasick (opcional)
+except ImportError:
+    ahocorasick = None
+
+
+# Opção exibida na interface para classificar cada arquivo individualmente
+AUTO_DOC_TYPE = "Detecção automática"
+
+# Pesos da pontuação: cada âncora distinta encontrada e a fração de campos encontrados
+ANCHOR_WEIGHT = 2.0
+FIELD_WEIGHT = 1.5
+# Ocorrências repetidas da mesma âncora contam até este limite
+MAX_ANCHOR_REPEATS = 3
+
+
+class KeywordAutomaton:
+    """
+    Conta ocorrências de palavras-chave (palavras inteiras, sem diferenciar
+    maiúsculas) numa única passada pelo texto
+
+    Usa um autômato Aho-Corasick (pyahocorasick) quando instalado; caso
+    contrário, uma única regex com todas as palavras em alternância.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = sorted({k.casefold() for k in keywords}, key=len, reverse=True)
+        self._automaton = None
+        self._regex = None
+
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for keyword in self.keywords:
+                self._automaton.add_word(keyword, keyword)
+            self._automaton.make_automaton()
+        else:
+            alternatives = "|".join(re.escape(k) for k in self.keywords)
+            self._regex = re.compile(rf"(?<!\w)(?:{alternatives})(?!\w)")
+
+    def count(self, text: str) -> Counter:
+        """Retorna palavra-chave -> número de ocorrências"""
+        text = text.casefold()
+        if self._regex is not None:
+            return Counter(self._regex.findall(text))
+
+        counts = Counter()
+        for end, keyword in self._automaton.iter(text):
+            start = end - len(keyword) + 1
+            # Aceitar apenas palavras inteiras
+            if start > 0 and text[start - 1].isalnum():
+                continue
+            if end + 1 < len(text) and text[end + 1].isalnum():
+                continue
+            counts[keyword] += 1
+        return counts
+
+
+_classifier_cache = {"key": None, "automaton": None}
+
+
+def _get_automaton() -> KeywordAutomaton:
+    """Autômato com as âncoras de todos os templates (reconstruído se o registro mudar)"""
+    key = tuple((name, id(template)) for name, template in REGISTRY.items())
+    if _classifier_cache["key"] != key:
+        keywords = [anchor for template in REGISTRY.values() for anchor in template.anchors]
+        _classifier_cache["automaton"] = KeywordAutomaton(keywords)
+        _classifier_cache["key"] = key
+    return _classifier_cache["automaton"]
+
+
+def classify_document(text: str) -> Dict[str, Any]:
+    """
+    Escolhe o template mais provável para o texto
+
+    A pontuação de cada template soma as âncoras distintas encontradas
+    (ANCHOR_WEIGHT cada, com bônus limitado por repetição) e a fração dos
+    seus campos que as regex conseguem extrair (FIELD_WEIGHT).
+
+    Returns:
+        Dict: {"doc_type": tipo escolhido ou None, "confidence": 0.0 a 1.0,
+               "scores": pontuação de cada template}
+    """
+    counts = _get_automaton().count(text)
+
+    scores = {}
+    for name, template in REGISTRY.items():
+        anchor_score = 0.0
+        for anchor in {a.casefold() for a in template.anchors}:
+            hits = min(counts.get(anchor, 0), MAX_ANCHOR_REPEATS)
+            if hits:
+                anchor_score += ANCHOR_WEIGHT + (hits - 1) * ANCHOR_WEIGHT / 4
+
+        fields = template.extractor.extract(text)
+        field_ratio = sum(1 for value in fields.values() if value) / max(len(fields), 1)
+
+        scores[name] = anchor_score + field_ratio * FIELD_WEIGHT
+
+    total = sum(scores.values())
+    if not scores or total == 0:
+        return {"doc_type": None, "confidence": 0.0, "scores": scores}
+
+    best = max(scores, key=scores.get)
+    return {"doc_type": best, "confidence": scores[best] / total, "scores": scores}
@@ -0,0 +1,82 @@
+"""
+Índice de conteúdo de um job: deduplicação de uploads por hash
+Cada corpo de PDF é guardado (e processado) uma única vez, mesmo com nomes diferentes
+"""
+import hashlib
+import posixpath
+from typing import Dict, Any, List, Union, BinaryIO
+
+
+def content_hash(content: bytes) -> str:
+    """Hash SHA-256 (hexadecimal) do conteúdo"""
+    return hashlib.sha256(content).hexdigest()
+
+
+def unique_name(name: str, taken: set) -> str:
+    """
+    Retorna `name` ou, se já estiver em `taken`, "nome (2).ext", "nome (3).ext"...
+    O nome escolhido é adicionado a `taken`.
+    """
+    unique = name
+    stem, ext = posixpath.splitext(name)
+    counter = 2
+    while unique in taken:
+        unique = f"{stem} ({counter}){ext}"
+        counter += 1
+    taken.add(unique)
+    return unique
+
+
+class ContentIndex:
+    """Mapeia os arquivos de um job para corpos únicos endereçados por hash"""
+
+    def __init__(self, store=None):
+        """
+        Args:
+            store: UploadStore opcional; com ele os conteúdos vão direto para o
+                   disco e o índice guarda apenas os handles (memória constante)
+        """
+        self.store = store
+        self.contents: Dict[str, bytes] = {}  # sha256 -> conteúdo (sem store; uma cópia por corpo)
+        self.sizes: Dict[str, int] = {}  # sha256 -> tamanho de cada corpo único
+        self.files: List[Dict[str, Any]] = []  # {"name", "sha256", "size"} na ordem de upload
+        self._names = set()
+
+    def add(self, name: str, content: Union[bytes, BinaryIO]) -> Dict[str, Any]:
+        """
+        Registra um arquivo do upload
+
+        Args:
+            name: Nome ou caminho relativo (ex.: membro do ZIP com pastas)
+            content: Conteúdo do PDF ou, com store, um arquivo aberto (copiado em blocos)
+
+        Returns:
+            Dict: {"name": nome único no job, "sha256", "size"}
+        """
+        if self.store is not None:
+            if isinstance(content, (bytes, bytearray)):
+                sha256, size = self.store.put(content), len(content)
+            else:
+                handle = self.store.put_stream(content)
+                sha256, size = handle["sha256"], handle["size"]
+        else:
+            sha256, size = content_hash(content), len(content)
+            if sha256 not in self.contents:
+                self.contents[sha256] = content
+        self.sizes.setdefault(sha256, size)
+
+        # Garante nomes distintos para arquivos diferentes com o mesmo nome
+        entry = {"name": unique_name(name, self._names), "sha256": sha256, "size": size}
+        self.files.append(entry)
+        return entry
+
+    def stats(self) -> Dict[str, int]:
+        """Resumo da deduplicação: arquivos, corpos únicos, duplicados e bytes poupados"""
+        total_bytes = sum(entry["size"] for entry in self.files)
+        unique_bytes = sum(self.sizes.values())
+        return {
+            "files": len(self.files),
+            "unique": len(self.sizes),
+            "duplicates": len(self.files) - len(self.sizes),
+            "bytes_saved": total_bytes - unique_bytes
+        }
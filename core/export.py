@@ -0,0 +1,121 @@
+"""
+Exportação dos PDFs renomeados em ZIP, entrada por entrada a partir do UploadStore
+PDFs já são comprimidos internamente: por padrão vão sem recompressão (ZIP_STORED)
+"""
+import os
+import time
+import zipfile
+from pathlib import Path
+from typing import Dict, Any, Iterable, Iterator, List, Tuple, Union, BinaryIO
+
+from core.dedup import unique_name
+from core.upload_store import CHUNK_SIZE
+
+
+EXPORT_DIR = Path("data/exports")
+EXPORT_MAX_AGE_SECONDS = 3600  # ZIPs gerados para download são temporários
+
+
+def compression_for(name: str) -> int:
+    """ZIP_STORED para PDFs (recomprimir rende ~1%), ZIP_DEFLATED para o resto"""
+    return zipfile.ZIP_STORED if name.lower().endswith(".pdf") else zipfile.ZIP_DEFLATED
+
+
+def export_entries(batch_manager, batch_ids: Iterable[str], uploads) -> Iterator[Tuple[str, str]]:
+    """
+    Entradas do ZIP de um ou mais lotes: (nome no arquivo, caminho no UploadStore)
+
+    Nomes repetidos (ex.: dois documentos com os mesmos campos, ou o mesmo
+    conteúdo em lotes diferentes) recebem sufixo " (2)", " (3)"...
+    Resultados cujo conteúdo não está mais no UploadStore são ignorados.
+    """
+    taken = set()
+    for batch_id in batch_ids:
+        batch = batch_manager.get_batch(batch_id)
+        if not batch:
+            continue
+        hashes = {f["name"]: f.get("sha256") for f in batch["files"]}
+        for result in batch["results"]:
+            sha256 = hashes.get(result["original"])
+            handle = uploads.handle(sha256) if sha256 else None
+            if handle:
+                yield unique_name(result["novo"], taken), handle["path"]
+
+
+def write_zip(entries: Iterable[Tuple[str, str]], target: Union[str, os.PathLike, BinaryIO]) -> int:
+    """
+    Grava o ZIP em um arquivo (caminho ou objeto de escrita), copiando cada
+    entrada do disco em blocos - nenhum PDF é carregado inteiro na memória
+
+    Returns:
+        int: Número de entradas gravadas
+    """
+    count = 0
+    with zipfile.ZipFile(target, "w") as zf:
+        for arcname, path in entries:
+            zf.write(path, arcname, compress_type=compression_for(arcname))
+            count += 1
+    return count
+
+
+class _ChunkSink:
+    """Destino de escrita sem seek: acumula os bytes gerados até serem consumidos"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> Iterator[bytes]:
+        chunks, self.chunks = self.chunks, []
+        return iter(chunks)
+
+
+def iter_zip(entries: Iterable[Tuple[str, str]], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Gera o ZIP em pedaços para uma resposta em streaming (chunked)
+
+    A memória usada fica limitada a um bloco de leitura, independentemente do
+    tamanho do arquivo final.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w") as zf:
+        for arcname, path in entries:
+            info = zipfile.ZipInfo.from_file(path, arcname)
+            info.compress_type = compression_for(arcname)
+            with open(path, "rb") as src, zf.open(info, "w") as dest:
+                for block in iter(lambda: src.read(chunk_size), b""):
+                    dest.write(block)
+                    yield from sink.drain()
+            yield from sink.drain()
+    yield from sink.drain()  # Diretório central
+
+
+def export_batches(batch_manager, batch_ids: Iterable[str], uploads, target) -> Dict[str, Any]:
+    """
+    Exporta os resultados de um ou mais lotes (ex.: todos os lotes concluídos
+    de um job) como um único ZIP gravado em `target`
+
+    Returns:
+        Dict: {"files": entradas gravadas, "bytes": tamanho do ZIP (se target for caminho)}
+    """
+    files = write_zip(export_entries(batch_manager, batch_ids, uploads), target)
+    size = os.path.getsize(target) if isinstance(target, (str, os.PathLike)) else None
+    return {"files": files, "bytes": size}
+
+
+def cleanup_exports(export_dir=EXPORT_DIR, max_age: float = EXPORT_MAX_AGE_SECONDS) -> int:
+    """Cria a pasta de exportação e remove ZIPs gerados há mais de `max_age` segundos"""
+    export_dir = Path(export_dir)
+    export_dir.mkdir(parents=True, exist_ok=True)
+    removed = 0
+    for path in export_dir.glob("*.zip"):
+        if time.time() - path.stat().st_mtime > max_age:
+            path.unlink(missing_ok=True)
+            removed += 1
+    return removed
@@ -0,0 +1,87 @@
+"""
+Ingestão preguiçosa de uploads: membros de ZIP e PDFs avulsos lidos um a um
+Cada arquivo só é descompactado quando o consumidor pede o próximo (back-pressure),
+indo direto para o UploadStore e para a criação dos lotes
+"""
+import posixpath
+import zipfile
+from typing import Iterable, Iterator, Optional, Tuple, Dict, Any, BinaryIO
+
+from core.dedup import ContentIndex
+from core.ocr import prescan_pdf
+
+
+# Entradas de metadados criadas por compactadores (não são documentos)
+IGNORED_PREFIXES = ("__MACOSX/",)
+
+
+def member_name(filename: str) -> Optional[str]:
+    """
+    Caminho normalizado de um membro do ZIP ou None se não for um PDF aproveitável
+
+    Mantém as pastas ("a/nf.pdf" e "b/nf.pdf" continuam distintos), usa "/"
+    como separador e descarta componentes vazios, "." e ".." (caminhos que
+    apontariam para fora do ZIP).
+    """
+    name = filename.replace("\\", "/")
+    if name.startswith(IGNORED_PREFIXES) or not name.lower().endswith(".pdf"):
+        return None
+    parts = [part for part in name.split("/") if part not in ("", ".", "..")]
+    if not parts or parts[-1].startswith("._"):  # Forks de recurso do macOS
+        return None
+    return posixpath.join(*parts)
+
+
+def count_zip_pdfs(zip_source) -> int:
+    """Quantidade de PDFs no ZIP, lida só do diretório central (sem descompactar)"""
+    with zipfile.ZipFile(zip_source) as zf:
+        return sum(1 for info in zf.infolist() if not info.is_dir() and member_name(info.filename))
+
+
+def iter_zip_members(zip_source) -> Iterator[Tuple[str, BinaryIO]]:
+    """
+    Gera (nome, arquivo aberto) para cada PDF do ZIP, na ordem do arquivo
+
+    O membro é descompactado sob demanda enquanto o consumidor lê o stream e
+    fechado quando o próximo é pedido; apenas um membro fica aberto por vez.
+    """
+    with zipfile.ZipFile(zip_source) as zf:
+        for info in zf.infolist():
+            name = member_name(info.filename)
+            if info.is_dir() or not name:
+                continue
+            with zf.open(info) as member:
+                yield name, member
+
+
+def iter_uploaded_files(files: Iterable) -> Iterator[Tuple[str, BinaryIO]]:
+    """Gera (nome, arquivo aberto) para PDFs enviados individualmente"""
+    for f in files:
+        f.seek(0)
+        yield f.name, f
+
+
+def ingest(members: Iterable[Tuple[str, BinaryIO]], index: ContentIndex,
+           prescan: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    Registra cada arquivo no índice do job (gravando-o no UploadStore do índice)
+    e gera seus metadados {"name", "sha256", "size"} um a um
+
+    Nada é lido antes de o consumidor pedir o próximo item; combinado com
+    BatchManager.create_batches_streaming, o primeiro lote entra na fila assim
+    que seus arquivos forem lidos.
+
+    Com prescan, os metadados incluem também "pages" e "text_layer"
+    (core.ocr.prescan_pdf, uma vez por conteúdo), usados pela BatchPolicy para
+    dimensionar os lotes.
+    """
+    scans: Dict[str, Dict[str, Any]] = {}
+    for name, stream in members:
+        entry = index.add(name, stream)
+        if prescan:
+            sha256 = entry["sha256"]
+            if sha256 not in scans:
+                source = str(index.store.path(sha256)) if index.store is not None else index.contents[sha256]
+                scans[sha256] = prescan_pdf(source)
+            entry.update(scans[sha256])
+        yield entry
@@ -0,0 +1,75 @@
+"""
+Normalização do texto extraído (OCR ou camada de texto) antes do parsing
+Executada uma vez por documento; todos os extratores de campos usam o resultado
+"""
+import re
+
+
+# Versão das regras (faz parte da chave do cache de OCR; incrementar ao alterá-las)
+NORMALIZATION_VERSION = 1
+
+# Caracteres tipográficos e invisíveis comuns na saída do OCR / PDFs digitais
+_CHAR_TABLE = str.maketrans({
+    "\u00a0": " ",   # espaço não separável
+    "\u2007": " ",   # espaço de algarismo
+    "\u202f": " ",   # espaço estreito não separável
+    "\t": " ",
+    "\r": None,
+    "\u2018": "'",
+    "\u2019": "'",
+    "\u201c": '"',
+    "\u201d": '"',
+    "\u2013": "-",   # travessão meia-risca
+    "\u2014": "-",   # travessão
+    "\u2212": "-",   # sinal de menos
+    "\ufb01": "fi",
+    "\ufb02": "fl",
+    "\u00ad": None,  # hífen condicional
+    "\u200b": None,  # espaço de largura zero
+    "\ufeff": None,
+})
+
+# Letras confundidas com algarismos pelo OCR (aplicado só dentro de números)
+_DIGIT_TABLE = str.maketrans({
+    "O": "0", "o": "0", "Q": "0", "D": "0",
+    "I": "1", "l": "1", "|": "1",
+    "S": "5", "B": "8", "Z": "2",
+})
+
+# Tokens numéricos com possíveis confusões: só algarismos, letras confundíveis
+# e separadores, com pelo menos dois algarismos reais
+_NUMERIC_TOKEN = re.compile(r"(?<![\w])(?=(?:[OoQDIl|SBZ.,/-]*\d){2})[\dOoQDIl|SBZ.,/-]+(?![\w])")
+_SPACES = re.compile(r"[ ]{2,}")
+_TRAILING_SPACES = re.compile(r"[ ]+\n")
+_BLANK_LINES = re.compile(r"\n{3,}")
+_HYPHENATION = re.compile(r"([a-zà-ú])-\n([a-zà-ú])")
+
+
+def _fix_digits(match):
+    return match.group(0).translate(_DIGIT_TABLE)
+
+
+def normalize_ocr_text(text: str) -> str:
+    """
+    Normaliza o texto para o parsing:
+    1. Tabela única de tradução (espaços especiais, aspas, travessões, ligaduras)
+    2. Junção de palavras hifenizadas na quebra de linha
+    3. Correção de confusões letra/algarismo dentro de números (O->0, l->1, S->5...)
+    4. Colapso de espaços e linhas em branco repetidos
+
+    Args:
+        text: Texto extraído
+
+    Returns:
+        str: Texto normalizado
+    """
+    if not text:
+        return text
+
+    text = text.translate(_CHAR_TABLE)
+    text = _HYPHENATION.sub(r"\1\2", text)
+    text = _NUMERIC_TOKEN.sub(_fix_digits, text)
+    text = _SPACES.sub(" ", text)
+    text = _TRAILING_SPACES.sub("\n", text)
+    text = _BLANK_LINES.sub("\n\n", text)
+    return text
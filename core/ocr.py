@@ -1,101 +1,509 @@
 """
 Módulo de OCR otimizado para processamento de PDFs
-Usa PyMuPDF + Tesseract com fallback para PyPDF2
+Usa PyMuPDF (camada de texto) + Tesseract (OCR) sobre um único documento aberto em memória
+O Tesseract roda residente via tesserocr quando disponível, ou via pytesseract
 """
 import pytesseract
 from PIL import Image
-import PyPDF2
 import fitz  # PyMuPDF
-import io
-import tempfile
+import numpy as np
 import os
+import threading
+import time
 
+from core.normalize import normalize_ocr_text, NORMALIZATION_VERSION
 
-def extract_text_from_pdf(pdf_content, max_pages=2, dpi=150):
+try:
+    import tesserocr  # Bindings da API C do Tesseract (opcional)
+except ImportError:
+    tesserocr = None
+
+
+# Parâmetros do Tesseract (também fazem parte da chave do cache)
+OCR_LANG = 'por'
+OCR_CONFIG = r'--oem 1 --psm 6'
+
+# Mínimo de caracteres na camada de texto para dispensar o OCR de uma página
+MIN_PAGE_TEXT_CHARS = 50
+
+# Confiança média mínima (0-100) do Tesseract para aceitar uma página sem
+# subir para o próximo DPI da escada (modo adaptativo)
+MIN_OCR_CONFIDENCE = 60
+
+# Detecção de páginas em branco (antes do OCR)
+BLANK_CHECK_DPI = 36          # Miniatura usada na verificação
+BLANK_INK_THRESHOLD = 0.001   # Fração mínima de pixels com "tinta" para fazer OCR
+BLANK_MIN_STD = 4.0           # Desvio padrão mínimo dos tons (página uniforme = vazia)
+BLANK_MIN_CONTRAST = 16       # Diferença mínima para o fundo de um pixel de "tinta"
+BLANK_STD_FACTOR = 3.0        # Ou k desvios padrão abaixo do fundo, se for maior
+BLANK_CHECK_VERSION = 2       # Parte da chave do cache (páginas descartadas pela versão anterior)
+
+# Backend de OCR: "auto" (tesserocr se disponível), "tesserocr" ou "pytesseract"
+OCR_BACKEND = os.environ.get("OCR_BACKEND", "auto")
+
+
+class PytesseractBackend:
+    """OCR via pytesseract: um processo `tesseract` por imagem (fallback)"""
+
+    name = "pytesseract"
+
+    def image_to_string(self, img):
+        return pytesseract.image_to_string(img, lang=OCR_LANG, config=OCR_CONFIG)
+
+    def pixmap_to_string(self, pix):
+        """OCR de um pixmap em tons de cinza"""
+        return self.image_to_string(pixmap_to_image(pix))
+
+    def pixmap_to_data(self, pix):
+        """OCR de um pixmap retornando (texto, confiança média das palavras 0-100)"""
+        data = pytesseract.image_to_data(pixmap_to_image(pix), lang=OCR_LANG,
+                                         config=OCR_CONFIG, output_type=pytesseract.Output.DICT)
+        lines = {}
+        confidences = []
+        for i, word in enumerate(data["text"]):
+            if not word.strip():
+                continue
+            line_key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            lines.setdefault(line_key, []).append(word)
+            conf = float(data["conf"][i])
+            if conf >= 0:
+                confidences.append(conf)
+        text = "\n".join(" ".join(words) for words in lines.values())
+        confidence = sum(confidences) / len(confidences) if confidences else 0.0
+        return text, confidence
+
+    def close(self):
+        pass
+
+
+class TesserocrBackend:
     """
-    Extrai texto de um PDF usando abordagem híbrida:
-    1. Tenta extração direta do texto (PyPDF2) - rápido
-    2. Fallback para OCR (Tesseract) se necessário - lento mas funciona em scans
-    
+    OCR via API C do Tesseract (tesserocr): o modelo do idioma é carregado
+    uma única vez e as imagens são passadas em memória, sem arquivo temporário
+    """
+
+    name = "tesserocr"
+
+    def __init__(self):
+        if tesserocr is None:
+            raise RuntimeError("tesserocr não está instalado")
+        # Equivalente a OCR_CONFIG: --oem 1 (LSTM) --psm 6 (bloco único)
+        self._api = tesserocr.PyTessBaseAPI(
+            lang=OCR_LANG,
+            oem=tesserocr.OEM.LSTM_ONLY,
+            psm=tesserocr.PSM.SINGLE_BLOCK
+        )
+
+    def image_to_string(self, img):
+        self._api.SetImage(img)
+        return self._api.GetUTF8Text()
+
+    def pixmap_to_string(self, pix):
+        """OCR de um pixmap em tons de cinza: amostras entregues cruas ao Tesseract"""
+        self._api.SetImageBytes(pix.samples, pix.width, pix.height, pix.n, pix.stride)
+        return self._api.GetUTF8Text()
+
+    def pixmap_to_data(self, pix):
+        """OCR de um pixmap retornando (texto, confiança média das palavras 0-100)"""
+        text = self.pixmap_to_string(pix)
+        return text, float(self._api.MeanTextConf())
+
+    def close(self):
+        self._api.End()
+
+
+_backends = threading.local()
+
+
+def create_ocr_backend(name=None):
+    """
+    Cria um backend de OCR
+
+    Args:
+        name: "auto", "tesserocr" ou "pytesseract" (default: OCR_BACKEND)
+
+    Returns:
+        Backend com image_to_string(img), pixmap_to_string(pix),
+        pixmap_to_data(pix) e close()
+    """
+    name = name or OCR_BACKEND
+    if name == "pytesseract":
+        return PytesseractBackend()
+    if name == "tesserocr":
+        return TesserocrBackend()
+    try:
+        return TesserocrBackend()
+    except Exception:
+        return PytesseractBackend()
+
+
+def get_ocr_backend():
+    """Retorna o backend residente da thread atual (criado na primeira chamada)"""
+    backend = getattr(_backends, "backend", None)
+    if backend is None:
+        backend = create_ocr_backend()
+        _backends.backend = backend
+    return backend
+
+
+def pixmap_to_image(pix):
+    """
+    Cria uma imagem PIL em tons de cinza sobre o buffer do pixmap, sem cópia
+    nem codificação intermediária (a imagem só é válida enquanto o pixmap existir)
+    """
+    return Image.frombuffer("L", (pix.width, pix.height), pix.samples_mv,
+                            "raw", "L", pix.stride, 1)
+
+
+def _open_document(pdf_content):
+    """
+    Abre o PDF diretamente da memória (sem arquivo temporário)
+
+    Args:
+        pdf_content: bytes, bytearray ou memoryview
+
+    Returns:
+        fitz.Document: Documento aberto (deve ser fechado pelo chamador)
+    """
+    return fitz.open(stream=pdf_content, filetype="pdf")
+
+
+def prescan_pdf(source, max_pages=2, min_page_chars=MIN_PAGE_TEXT_CHARS):
+    """
+    Pré-varredura barata (sem renderizar nada) usada na triagem e no
+    dimensionamento dos lotes
+
+    Args:
+        source: Conteúdo do PDF em bytes ou caminho do arquivo
+
+    Returns:
+        Dict: {"pages": total de páginas, "text_layer": se todas as páginas que
+               seriam processadas têm camada de texto suficiente (sem OCR)}
+              ou {} se o PDF não abrir
+    """
+    try:
+        if isinstance(source, (str, os.PathLike)):
+            pdf_document = fitz.open(source, filetype="pdf")
+        else:
+            pdf_document = _open_document(source)
+    except Exception:
+        return {}
+    try:
+        total = len(pdf_document)
+        pages = min(max_pages, total)
+        text_layer = pages > 0 and all(
+            len(pdf_document[page_num].get_text().strip()) >= min_page_chars
+            for page_num in range(pages)
+        )
+        return {"pages": total, "text_layer": text_layer}
+    except Exception:
+        return {}
+    finally:
+        pdf_document.close()
+
+
+def has_text_layer(pdf_content, max_pages=2, min_page_chars=MIN_PAGE_TEXT_CHARS):
+    """
+    Triagem: True se a extração não vai precisar de OCR (ver prescan_pdf)
+    PDFs que não abrem retornam False e seguem para a extração normal, que registra o erro.
+    """
+    return prescan_pdf(pdf_content, max_pages, min_page_chars).get("text_layer", False)
+
+
+def extract_text_from_pdf(pdf_content, max_pages=2, dpi=150, cache=None,
+                          min_page_chars=MIN_PAGE_TEXT_CHARS, stats=None, stop_when=None,
+                          regions=None, dpi_ladder=None, min_confidence=MIN_OCR_CONFIDENCE,
+                          blank_ink_threshold=BLANK_INK_THRESHOLD, normalize=False):
+    """
+    Extrai texto de um PDF decidindo página a página:
+    1. Usa a camada de texto da página se tiver conteúdo suficiente - rápido
+    2. Faz OCR (Tesseract) apenas nas páginas sem texto - lento mas funciona em scans
+
+    O documento é aberto uma única vez a partir dos bytes em memória e o mesmo
+    handle é compartilhado entre as duas etapas.
+
     Args:
         pdf_content: Conteúdo do PDF em bytes
         max_pages: Número máximo de páginas para processar (default: 2)
         dpi: Resolução para OCR (default: 150 para velocidade)
-    
+        cache: OCRCache opcional; um acerto dispensa as duas etapas
+        min_page_chars: Caracteres mínimos na camada de texto para não fazer OCR da página
+        stats: Dicionário opcional preenchido com estatísticas da extração
+               ("pages": lista com "page", "text_chars", "ocr", "seconds" por página)
+        stop_when: Função opcional texto -> bool chamada após cada página; quando
+                   verdadeira, as páginas seguintes não são processadas
+                   (ex.: parser.RequiredFieldsCheck). Seu repr entra na chave do cache.
+        regions: Regiões de interesse [(x0, y0, x1, y1)] em frações da página
+                 (ex.: TEMPLATES[...]["ocr_regions"]). Com stop_when, o OCR é feito
+                 primeiro só nessas regiões; a página inteira só é processada
+                 se algum campo não for encontrado nelas.
+        dpi_ladder: Sequência crescente de DPIs para OCR adaptativo (ex.: (100, 150, 225)).
+                    Cada página começa no menor DPI e só é renderizada de novo no
+                    próximo se a confiança média ficar abaixo de min_confidence ou,
+                    na última página, se stop_when ainda não for satisfeito.
+                    Quando omitido, usa apenas `dpi`.
+        min_confidence: Confiança média mínima (0-100) para aceitar uma página
+        blank_ink_threshold: Páginas sem texto com cobertura de tinta abaixo deste
+                             valor são consideradas em branco e não vão para o OCR
+                             (None ou 0 desativa a verificação)
+        normalize: Aplica core.normalize.normalize_ocr_text ao texto (uma vez por
+                   documento); stop_when passa a avaliar o texto normalizado e o
+                   resultado normalizado é guardado no cache junto do texto bruto
+
     Returns:
         str: Texto extraído do PDF
     """
-    tmp_path = None
-    
+    if not isinstance(pdf_content, (bytes, bytearray, memoryview)):
+        pdf_content = pdf_content.read()
+    if stats is None:
+        stats = {}
+
+    if stop_when is None:
+        regions = None  # Sem critério de parada não há como validar as regiões
+
+    check = stop_when
+    if normalize and stop_when is not None:
+        check = _NormalizedCheck(stop_when)
+
+    options = {
+        "max_pages": max_pages,
+        "dpi_ladder": tuple(dpi_ladder) if dpi_ladder else (dpi,),
+        "min_confidence": min_confidence,
+        "min_page_chars": min_page_chars,
+        "blank_ink_threshold": blank_ink_threshold,
+        "stop_when": check,
+        "regions": regions
+    }
+
+    if cache is None:
+        text = _extract_text(pdf_content, stats, **options)
+        return _normalized(text) if normalize else text
+
+    key = cache.make_key(pdf_content, max_pages=max_pages, dpi_ladder=options["dpi_ladder"],
+                         min_confidence=min_confidence if dpi_ladder else None,
+                         lang=OCR_LANG, config=OCR_CONFIG, backend=get_ocr_backend().name,
+                         min_page_chars=min_page_chars, blank_ink_threshold=blank_ink_threshold,
+                         blank_check=BLANK_CHECK_VERSION if blank_ink_threshold else None,
+                         stop_when=repr(check), regions=regions,
+                         normalization=NORMALIZATION_VERSION)
+    entry = cache.get_entry(key)
+    stats["cache_hit"] = entry is not None
+    if entry is not None:
+        if not normalize:
+            return entry["text"]
+        if entry["normalized"] is not None:
+            return entry["normalized"]
+        # Entrada gravada sem normalização: normaliza agora e completa o cache
+        normalized = _normalized(entry["text"])
+        cache.put(key, entry["text"], normalized)
+        return normalized
+
+    text = _extract_text(pdf_content, stats, **options)
+    # Erros não são armazenados para permitir nova tentativa
+    if text.startswith("ERRO"):
+        return text
+    normalized = _normalized(text) if normalize else None
+    cache.put(key, text, normalized)
+    return normalized if normalize else text
+
+
+def _normalized(text: str) -> str:
+    """Normaliza o texto extraído, preservando as mensagens de erro"""
+    if text.startswith("ERRO"):
+        return text
+    return normalize_ocr_text(text)
+
+
+class _NormalizedCheck:
+    """Aplica stop_when sobre o texto normalizado (mesmo texto que o parser receberá)"""
+
+    def __init__(self, stop_when):
+        self.stop_when = stop_when
+
+    def __call__(self, text: str) -> bool:
+        return self.stop_when(normalize_ocr_text(text))
+
+    def __repr__(self):
+        return f"normalized(v{NORMALIZATION_VERSION}, {self.stop_when!r})"
+
+
+def _render_page(page, dpi, clip=None):
+    """Renderiza uma página (ou apenas o retângulo `clip`) para OCR"""
+    zoom = dpi / 72
+    mat = fitz.Matrix(zoom, zoom)
+
+    # Renderizar direto em tons de cinza (1 byte/pixel em vez de 3)
+    return page.get_pixmap(matrix=mat, clip=clip, colorspace=fitz.csGRAY, alpha=False)
+
+
+def _ocr_page(page, dpi, clip=None):
+    """Renderiza uma página (ou apenas o retângulo `clip`) e aplica o Tesseract"""
+    return get_ocr_backend().pixmap_to_string(_render_page(page, dpi, clip))
+
+
+def _ocr_page_adaptive(page, dpi_ladder, min_confidence, stop_when,
+                       previous_text, is_last_page, page_stat):
+    """
+    OCR da página inteira subindo na escada de DPI apenas quando necessário
+
+    Com um único DPI equivale a _ocr_page. Caso contrário, a página é
+    reprocessada no próximo DPI se a confiança média ficar abaixo de
+    min_confidence ou, na última página, se os campos ainda não foram
+    encontrados (nas páginas anteriores eles podem estar mais adiante).
+    """
+    if len(dpi_ladder) == 1:
+        page_stat["dpi"] = dpi_ladder[0]
+        return _ocr_page(page, dpi_ladder[0])
+
+    backend = get_ocr_backend()
+    for step, dpi in enumerate(dpi_ladder):
+        text, confidence = backend.pixmap_to_data(_render_page(page, dpi))
+        page_stat["dpi"] = dpi
+        page_stat["confidence"] = confidence
+        page_stat["escalations"] = step
+
+        if step + 1 == len(dpi_ladder):
+            break
+        if confidence < min_confidence:
+            continue
+        if stop_when is not None and is_last_page and not stop_when(previous_text + text):
+            continue
+        break
+    return text
+
+
+def _is_blank_page(page, ink_threshold, page_stat):
+    """
+    Verificação vetorizada de página em branco sobre uma miniatura em tons de cinza
+
+    "Tinta" são os pixels mais escuros que o fundo (mediana da página) por
+    uma margem tirada da própria página: BLANK_STD_FACTOR desvios padrão, no
+    mínimo BLANK_MIN_CONTRAST. Na miniatura os traços finos viram cinza claro,
+    então um corte fixo descartaria recibos desbotados. A página só é vazia
+    com pouca tinta E tons uniformes (desvio padrão baixo); na dúvida, vai
+    para o OCR.
+    """
+    pix = _render_page(page, BLANK_CHECK_DPI)
+    samples = np.frombuffer(pix.samples_mv, dtype=np.uint8)
+    thumb = samples.reshape(pix.height, pix.stride)[:, :pix.width]
+
+    background = np.median(thumb)
+    std = float(thumb.std())
+    cutoff = background - max(BLANK_MIN_CONTRAST, BLANK_STD_FACTOR * std)
+    ink = float(np.count_nonzero(thumb < cutoff)) / thumb.size
+    del samples, thumb  # Liberar a visão do buffer antes do pixmap
+
+    page_stat["ink"] = ink
+    return ink < ink_threshold and std < BLANK_MIN_STD
+
+
+def _region_rect(page, region):
+    """Converte uma região em frações (x0, y0, x1, y1) para um retângulo da página"""
+    x0, y0, x1, y1 = region
+    rect = page.rect
+    return fitz.Rect(
+        rect.x0 + x0 * rect.width, rect.y0 + y0 * rect.height,
+        rect.x0 + x1 * rect.width, rect.y0 + y1 * rect.height
+    )
+
+
+def _ocr_page_regions(page, dpi, regions, stop_when, previous_text, page_stat):
+    """
+    Faz OCR apenas das regiões de interesse, uma por vez
+
+    Returns:
+        str ou None: Texto das regiões se todos os campos foram encontrados,
+                     None se for preciso processar a página inteira
+    """
+    region_text = ""
+    for region in regions:
+        region_text += _ocr_page(page, dpi, clip=_region_rect(page, region)) + "\n"
+        page_stat["regions"] = page_stat.get("regions", 0) + 1
+        if stop_when(previous_text + region_text):
+            return region_text
+    return None
+
+
+def _extract_text(pdf_content, stats, max_pages, dpi_ladder, min_confidence,
+                  min_page_chars, blank_ink_threshold, stop_when, regions):
+    """Executa a extração página a página (camada de texto ou OCR) sem cache"""
+    try:
+        pdf_document = _open_document(pdf_content)
+    except Exception as e:
+        return f"ERRO: {str(e)}"
+
+    page_stats = []
+    stats["pages"] = page_stats
+    stats["stopped_early"] = False
+
     try:
-        # Criar arquivo temporário
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            if isinstance(pdf_content, bytes):
-                tmp_file.write(pdf_content)
-            else:
-                tmp_file.write(pdf_content.read())
-            tmp_path = tmp_file.name
-        
-        # ETAPA 1: Tentar extração direta (mais rápido)
+        pages_to_process = min(max_pages, len(pdf_document))
         full_text = ""
-        try:
-            with open(tmp_path, 'rb') as pdf_file:
-                pdf_reader = PyPDF2.PdfReader(pdf_file)
-                pages_to_read = min(max_pages, len(pdf_reader.pages))
-                
-                for page_num in range(pages_to_read):
-                    page = pdf_reader.pages[page_num]
-                    text = page.extract_text()
-                    if text:
-                        full_text += text + "\n"
-        except Exception:
-            pass
-        
-        # Se extraiu texto suficiente, retornar
-        if len(full_text.strip()) > 50:
-            return full_text
-        
-        # ETAPA 2: Fallback para OCR (documentos escaneados)
-        try:
-            pdf_document = fitz.open(tmp_path)
-            pages_to_process = min(max_pages, len(pdf_document))
-            
-            for page_num in range(pages_to_process):
-                page = pdf_document[page_num]
-                
-                # Converter página para imagem
-                zoom = dpi / 72
-                mat = fitz.Matrix(zoom, zoom)
-                pix = page.get_pixmap(matrix=mat, alpha=False)
-                
-                # Converter para PIL Image
-                img_data = pix.tobytes("ppm")
-                img = Image.open(io.BytesIO(img_data))
-                
-                # Aplicar OCR
+        ocr_error = None
+
+        for page_num in range(pages_to_process):
+            start = time.perf_counter()
+            page = pdf_document[page_num]
+
+            # ETAPA 1: Camada de texto da página (mais rápido)
+            try:
+                text = page.get_text()
+            except Exception:
+                text = ""
+            text_chars = len(text.strip())
+            page_stat = {"page": page_num, "text_chars": text_chars, "ocr": False}
+
+            # Páginas em branco (separadores, versos) não vão para o OCR
+            needs_ocr = text_chars < min_page_chars
+            if needs_ocr and blank_ink_threshold and _is_blank_page(page, blank_ink_threshold, page_stat):
+                page_stat["blank"] = True
+                needs_ocr = False
+
+            # ETAPA 2: OCR apenas se a página não tiver texto suficiente
+            if needs_ocr:
+                page_stat["ocr"] = True
                 try:
-                    custom_config = r'--oem 1 --psm 6'
-                    text = pytesseract.image_to_string(img, lang='por', config=custom_config)
-                    full_text += text + "\n"
-                except Exception:
-                    continue
-            
-            pdf_document.close()
-            
-        except Exception as ocr_error:
-            if full_text.strip():
-                return full_text
-            else:
-                return f"ERRO OCR: {str(ocr_error)}"
-        
-        return full_text if full_text.strip() else "ERRO: Nenhum texto extraído"
-        
+                    ocr_text = None
+                    if regions:
+                        # Regiões são pequenas: sempre no primeiro DPI da escada
+                        ocr_text = _ocr_page_regions(page, dpi_ladder[0], regions, stop_when,
+                                                     full_text, page_stat)
+                        page_stat["region_hit"] = ocr_text is not None
+                    if ocr_text is None:
+                        ocr_text = _ocr_page_adaptive(
+                            page, dpi_ladder, min_confidence, stop_when, full_text,
+                            page_num + 1 == pages_to_process, page_stat
+                        )
+                    if ocr_text.strip():
+                        text = ocr_text
+                except Exception as e:
+                    # Guardar só a mensagem: o traceback manteria vivos os
+                    # buffers de imagem que apontam para o pixmap da página
+                    ocr_error = str(e)
+
+            if text:
+                full_text += text + "\n"
+
+            page_stat["seconds"] = time.perf_counter() - start
+            page_stats.append(page_stat)
+
+            # Parada antecipada: todos os campos necessários já foram encontrados
+            if stop_when is not None and page_num + 1 < pages_to_process and stop_when(full_text):
+                stats["stopped_early"] = True
+                break
+
+        stats["ocr_pages"] = sum(1 for p in page_stats if p["ocr"])
+        stats["text_layer_pages"] = sum(1 for p in page_stats if not p["ocr"] and not p.get("blank"))
+        stats["escalated_pages"] = sum(1 for p in page_stats if p.get("escalations"))
+        stats["blank_pages"] = sum(1 for p in page_stats if p.get("blank"))
+
+        if full_text.strip():
+            return full_text
+        if ocr_error is not None:
+            return f"ERRO OCR: {ocr_error}"
+        return "ERRO: Nenhum texto extraído"
+
     except Exception as e:
         return f"ERRO: {str(e)}"
     finally:
-        # Limpar arquivo temporário
-        if tmp_path and os.path.exists(tmp_path):
-            try:
-                os.unlink(tmp_path)
-            except:
-                pass
+        pdf_document.close()
@@ -0,0 +1,337 @@
+"""
+Motor de extração paralela para processamento de lotes
+Distribui OCR + parsing entre vários processos (um por núcleo)
+"""
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, CancelledError, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, Iterator, List, Optional, Tuple, Union
+
+from core.ocr import extract_text_from_pdf
+from core.cache import get_default_cache
+from core.parser import generate_filename, RequiredFieldsCheck, TEMPLATES
+from core.classifier import AUTO_DOC_TYPE, classify_document
+
+
+# Opções de extração repassadas a cada arquivo
+DEFAULT_OPTIONS = {
+    "max_pages": 2,
+    "dpi": 150,
+    "dpi_ladder": None,   # Ex.: (100, 150, 225) para OCR com DPI adaptativo
+    "use_cache": True,
+    "early_exit": True,
+    "normalize": True     # Normaliza o texto uma vez antes do classificador e do parser
+}
+
+
+# Falhas da infraestrutura (pool quebrado, tarefa cancelada), não do arquivo:
+# não viram erro registrado, o arquivo continua pendente para a retomada
+POOL_FAILURES = (BrokenProcessPool, CancelledError)
+
+
+def default_workers() -> int:
+    """Número padrão de processos: um por núcleo disponível"""
+    return os.cpu_count() or 1
+
+
+def _init_worker():
+    """Inicializa o processo worker"""
+    # Cada worker já ocupa um núcleo; impedir que o Tesseract abra
+    # threads OpenMP extras evita disputa de CPU entre os processos
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def extract_file(file_content: Union[bytes, str], doc_type: str, pattern: str,
+                 options: Optional[Dict[str, Any]] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    Extrai o texto de um único arquivo (camada de texto e/ou OCR)
+
+    Args:
+        file_content: Conteúdo do PDF ou caminho do arquivo (handle do UploadStore)
+        doc_type: Tipo de documento (define os campos da saída antecipada)
+        options: Opções de extração (ver DEFAULT_OPTIONS)
+
+    Returns:
+        Tuple: (texto extraído, estatísticas da extração)
+    """
+    if isinstance(file_content, (str, os.PathLike)):
+        # Só o caminho atravessa o pool; os bytes são lidos dentro do worker
+        with open(file_content, "rb") as f:
+            file_content = f.read()
+
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    extract_kwargs = {
+        "max_pages": options["max_pages"],
+        "dpi": options["dpi"],
+        "dpi_ladder": options["dpi_ladder"],
+        "normalize": options["normalize"]
+    }
+    if "min_confidence" in options:
+        extract_kwargs["min_confidence"] = options["min_confidence"]
+    if options["use_cache"]:
+        extract_kwargs["cache"] = get_default_cache()
+    if options["early_exit"]:
+        extract_kwargs["stop_when"] = RequiredFieldsCheck(doc_type, pattern)
+        extract_kwargs["regions"] = TEMPLATES.get(doc_type, {}).get("ocr_regions")
+
+    stats = {}
+    text = extract_text_from_pdf(file_content, stats=stats, **extract_kwargs)
+    return text, stats
+
+
+def parse_text(file_name: str, text: str, stats: Dict[str, Any], doc_type: str, pattern: str,
+               index: int) -> Dict[str, Any]:
+    """
+    Classifica (na detecção automática) e gera o novo nome a partir do texto extraído
+
+    Returns:
+        Dict: Mesmo formato de process_file
+    """
+    if doc_type == AUTO_DOC_TYPE:
+        classification = classify_document(text)
+        stats["classification"] = classification
+        doc_type = classification["doc_type"]
+
+    new_name = generate_filename(text, doc_type, pattern)
+    matched = bool(new_name)
+    if not matched:
+        new_name = f"SEM_DADOS_{index}"
+
+    return {"original": file_name, "novo": f"{new_name}.pdf", "matched": matched, "stats": stats}
+
+
+def process_file(file_name: str, file_content: Union[bytes, str], doc_type: str, pattern: str,
+                 index: int, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Extrai o texto e gera o novo nome de um único arquivo
+    (executado dentro do processo worker)
+
+    Args:
+        file_content: Conteúdo do PDF ou caminho do arquivo (handle do UploadStore)
+        doc_type: Tipo de documento ou AUTO_DOC_TYPE para classificar pelo texto
+        options: Opções de extração (ver DEFAULT_OPTIONS)
+
+    Returns:
+        Dict: {"original": nome original, "novo": novo nome com extensão,
+               "matched": se algum campo foi encontrado,
+               "stats": estatísticas da extração}
+        Na detecção automática, "stats" inclui "classification"
+        (tipo escolhido, confiança e pontuações).
+    """
+    text, stats = extract_file(file_content, doc_type, pattern, options)
+    return parse_text(file_name, text, stats, doc_type, pattern, index)
+
+
+class ParallelExtractor:
+    """Processa lotes do BatchManager em paralelo usando um pool de processos"""
+
+    def __init__(self, max_workers: Optional[int] = None, **options):
+        """
+        Args:
+            max_workers: Número de processos (default: número de núcleos)
+            **options: Opções de extração (ver DEFAULT_OPTIONS; aceita também min_confidence)
+        """
+        self.max_workers = max_workers or default_workers()
+        self.options = {**DEFAULT_OPTIONS, **options}
+        self.duplicates_skipped = 0  # Arquivos resolvidos sem novo processamento (mesmo conteúdo)
+        self._executor = None
+
+    @staticmethod
+    def _new_pool(workers: int) -> ProcessPoolExecutor:
+        # "spawn" evita herdar threads do servidor (Streamlit) via fork
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker
+        )
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Cria o pool sob demanda e o reutiliza entre lotes"""
+        if self._executor is None:
+            self._executor = self._new_pool(self.max_workers)
+        return self._executor
+
+    def shutdown(self):
+        """Encerra o pool de processos"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _discard_executor(self):
+        """
+        Descarta um pool quebrado (processo filho morto por falta de memória ou
+        falha no Tesseract/MuPDF); o próximo lote cria um pool novo
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    def process_batch(self, batch_manager, batch_id: str, files_data: Dict[str, bytes],
+                      known_results: Optional[Dict[str, Dict[str, Any]]] = None,
+                      resume: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Processa todos os arquivos de um lote em paralelo
+
+        Os resultados são registrados no BatchManager (add_batch_result /
+        add_batch_error) no processo principal e devolvidos na ordem em que
+        ficam prontos, permitindo atualizar o progresso em tempo real.
+
+        Arquivos com o mesmo conteúdo ("sha256" nos metadados do lote) são
+        extraídos uma única vez e o resultado é replicado para todos eles.
+
+        Com resume, arquivos que já têm resultado ou erro registrado no lote
+        (ex.: lote interrompido e retomado) são pulados; o texto dos que
+        ficaram pela metade costuma vir do cache de OCR.
+
+        Args:
+            batch_manager: Instância de BatchManager
+            batch_id: ID do lote a processar
+            files_data: Conteúdo binário dos PDFs, indexado pelo "sha256" dos
+                        metadados do arquivo (ou pelo nome, se não houver hash),
+                        ou um UploadStore - nesse caso os processos recebem
+                        apenas o caminho de cada arquivo
+            known_results: Dicionário opcional sha256 -> resultado, compartilhado
+                           entre os lotes de um job para não reprocessar duplicados
+            resume: Continua a partir dos arquivos ainda não registrados
+
+        Yields:
+            Dict: {"original", "novo", "content"} (ou "handle" com UploadStore)
+                  em caso de sucesso ou {"file", "error"} em caso de falha
+
+        Raises:
+            BrokenProcessPool: Um processo do pool morreu (ou uma tarefa foi
+                               cancelada); os resultados prontos são registrados,
+                               o pool é descartado e os arquivos sem resultado
+                               continuam pendentes
+        """
+        batch = batch_manager.get_batch(batch_id)
+        if not batch:
+            return
+        if known_results is None:
+            known_results = {}
+
+        executor = self._get_executor()
+        futures = {}
+        jobs, members, payloads = [], {}, {}
+        yield from self._schedule(batch_manager, batch_id, batch, files_data, known_results,
+                                  resume, jobs, members, payloads)
+
+        try:
+            for key, idx, file_name, source in jobs:
+                future = executor.submit(process_file, file_name, source,
+                                         batch["doc_type"], batch["pattern"], idx, self.options)
+                futures[future] = key
+        except BrokenProcessPool:
+            self._discard_executor()
+            raise
+
+        pool_failure = None
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                result = future.result()
+            except POOL_FAILURES as e:
+                # Falha do pool, não do arquivo: registra os que já terminaram e
+                # deixa os demais pendentes; o lote volta para a fila (ver BatchWorker)
+                pool_failure = pool_failure or e
+                continue
+            except Exception as e:
+                yield from self._record_error(batch_manager, batch_id, members[key], str(e))
+                continue
+            yield from self._record_members(batch_manager, batch_id, result, key,
+                                            known_results, members, payloads)
+        self._raise_pool_failure(pool_failure)
+
+    def _schedule(self, batch_manager, batch_id, batch, files_data, known_results, resume,
+                  jobs: List[tuple], members: Dict[str, list], payloads: Dict[str, Any]):
+        """
+        Decide o que fazer com cada arquivo do lote, preenchendo:
+        - jobs: (chave, índice, nome, bytes ou caminho) dos conteúdos a extrair
+        - members: chave do conteúdo -> [(índice, nome)] aguardando o resultado
+        - payloads: chave do conteúdo -> {"content": bytes} ou {"handle": handle}
+
+        Arquivos sem conteúdo e duplicados de resultados já conhecidos são
+        registrados aqui mesmo e devolvidos como eventos (ver process_batch).
+        """
+        uses_handles = hasattr(files_data, "handle")
+
+        done = set()
+        if resume:
+            done = {r.get("original") for r in batch["results"]} | {e.get("file") for e in batch["errors"]}
+
+        for idx, file_meta in enumerate(batch["files"]):
+            file_name = file_meta["name"]
+            if file_name in done:
+                continue
+            key = file_meta.get("sha256", file_name)
+            if key not in payloads:
+                if uses_handles:
+                    handle = files_data.handle(key)
+                    payloads[key] = {"handle": handle} if handle else None
+                else:
+                    content = files_data.get(key)
+                    payloads[key] = {"content": content} if content else None
+
+            if not payloads[key]:
+                error = {"file": file_name, "error": "Arquivo não encontrado"}
+                batch_manager.add_batch_error(batch_id, error)
+                yield error
+                continue
+
+            if key in known_results:
+                # Conteúdo já processado em outro lote do job
+                self.duplicates_skipped += 1
+                yield self._record(batch_manager, batch_id, known_results[key],
+                                   idx, file_name, payloads[key])
+                continue
+
+            if key in members:
+                # Duplicado dentro do lote: aguarda o resultado do primeiro
+                self.duplicates_skipped += 1
+                members[key].append((idx, file_name))
+                continue
+
+            members[key] = [(idx, file_name)]
+            payload = payloads[key]
+            jobs.append((key, idx, file_name,
+                         payload["handle"]["path"] if uses_handles else payload["content"]))
+
+    def _raise_pool_failure(self, failure: Optional[BaseException]):
+        """Descarta o pool e propaga a falha como BrokenProcessPool (se houver)"""
+        if failure is None:
+            return
+        self._discard_executor()
+        if isinstance(failure, BrokenProcessPool):
+            raise failure
+        raise BrokenProcessPool(f"Tarefa do pool interrompida: {failure!r}") from failure
+
+    def _record_members(self, batch_manager, batch_id, result, key, known_results, members, payloads):
+        """Replica o resultado de um conteúdo para todos os arquivos que o compartilham"""
+        known_results[key] = result
+        for idx, file_name in members[key]:
+            yield self._record(batch_manager, batch_id, result, idx, file_name, payloads[key])
+
+    @staticmethod
+    def _record_error(batch_manager, batch_id, file_members, message):
+        """Registra a falha de um conteúdo para todos os arquivos que o compartilham"""
+        for _, file_name in file_members:
+            error = {"file": file_name, "error": message}
+            batch_manager.add_batch_error(batch_id, error)
+            yield error
+
+    @staticmethod
+    def _record(batch_manager, batch_id, result, idx, file_name, payload):
+        """Registra o resultado de um conteúdo para um arquivo específico do lote"""
+        novo = result["novo"] if result["matched"] else f"SEM_DADOS_{idx}.pdf"
+        file_result = {"original": file_name, "novo": novo, "stats": result["stats"]}
+        if file_name != result["original"]:
+            file_result["duplicate_of"] = result["original"]
+        batch_manager.add_batch_result(batch_id, file_result)
+        return {**file_result, **payload}
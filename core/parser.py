@@ -1,41 +1,202 @@
 """
 Módulo de parsing e extração de dados estruturados de PDFs
+
+Os tipos de documento são definidos de forma declarativa (core/templates.json)
+e compilados uma única vez em CompiledTemplate, mantidos em REGISTRY.
 """
+import json
 import re
 from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
 
 
-# Templates predefinidos para diferentes tipos de documentos
-TEMPLATES = {
-    "Notas Fiscais": {
-        "regex_patterns": {
-            "numero": r"(?:N[FºªOo°]?\.?\s*|Nota\s+Fiscal\s*[Nn][ºªOo°]?\.?\s*|NF\s*)[:\s]*(\d{3,})",
-            "data": r"(\d{2}[/-]\d{2}[/-]\d{4})",
-            "valor": r"(?:R\$|RS|TOTAL|Valor)\s*[:\s]*(\d{1,3}(?:\.\d{3})*(?:,\d{2})?)"
-        }
-    },
-    "Comprovantes de Pagamento": {
-        "regex_patterns": {
-            "fornecedor": r"(?:Fornecedor|Beneficiário|Para)[:\s]*([A-ZÀ-Ú][A-Za-zÀ-ú\s]{3,30})",
-            "data": r"(\d{2}[/-]\d{2}[/-]\d{4})",
-            "valor": r"(?:R\$|RS|Valor)\s*[:\s]*(\d{1,3}(?:\.\d{3})*(?:,\d{2})?)"
-        }
-    },
-    "Processos Judiciais": {
-        "regex_patterns": {
-            "numero": r"(?:Processo|Proc\.?|N[ºª])[:\s]*(\d{7}-\d{2}\.\d{4}\.\d\.\d{2}\.\d{4}|\d{10,})",
-            "parte": r"(?:Autor|Réu|Requerente)[:\s]*([A-ZÀ-Ú][A-Za-zÀ-ú\s]{3,40})",
-            "data": r"(\d{2}[/-]\d{2}[/-]\d{4})"
+# Flags usadas em todos os padrões dos templates
+REGEX_FLAGS = re.IGNORECASE | re.MULTILINE
+
+# Arquivo com os templates predefinidos
+TEMPLATES_PATH = Path(__file__).parent / "templates.json"
+
+
+# Normalizadores disponíveis para os campos no "name_layout"
+NORMALIZERS: Dict[str, Callable[[str], str]] = {
+    "date": lambda value: value.replace("/", "-"),
+    "currency": lambda value: value.replace(".", "").replace(",", "."),
+}
+
+
+def load_templates(path=TEMPLATES_PATH) -> Dict[str, Dict[str, Any]]:
+    """
+    Carrega templates de um arquivo JSON
+
+    Formato de cada tipo de documento:
+        "regex_patterns": {campo: regex com o valor no grupo 1}
+        "ocr_regions": [[x0, y0, x1, y1], ...] em frações da página (opcional),
+                       áreas onde os campos costumam estar; o OCR tenta essas
+                       áreas antes da página inteira
+        "anchors": termos característicos do tipo, usados na classificação
+                   automática (core.classifier) (opcional)
+        "name_layout": partes do nome, em ordem, cada uma com
+            "field": campo extraído
+            "normalize": nome (ou lista de nomes) em NORMALIZERS (opcional)
+            "max_length": limite de caracteres após normalizar (opcional)
+            "format": modelo da parte com {value} e {sep} (default "{value}")
+            "when_pattern": só inclui a parte se o texto estiver no padrão (opcional)
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class FieldExtractor:
+    """
+    Extrator de campos de um template, com os padrões compilados uma única vez
+
+    Cada campo usa uma busca própria que para na primeira ocorrência. Uma
+    varredura única com os padrões combinados (alternância com grupos
+    nomeados) foi medida em benchmarks/bench_extractor.py e é mais lenta no
+    módulo re, que perde a otimização de busca por prefixo literal.
+    """
+
+    def __init__(self, regex_patterns: Dict[str, str]):
+        self.fields = list(regex_patterns)
+        self.patterns = {
+            field: re.compile(pattern, REGEX_FLAGS)
+            for field, pattern in regex_patterns.items()
         }
-    },
-    "Processos de Sinistros": {
-        "regex_patterns": {
-            "numero": r"(?:Sinistro|Sin\.?)[:\s]*(\d{5,})",
-            "segurado": r"(?:Segurado|Beneficiário)[:\s]*([A-ZÀ-Ú][A-Za-zÀ-ú\s]{3,40})",
-            "data": r"(\d{2}[/-]\d{2}[/-]\d{4})"
+
+    def extract_one(self, text: str, field_name: str) -> str:
+        """Extrai um campo (equivalente a extract_field)"""
+        match = self.patterns[field_name].search(text)
+        if match:
+            return match.group(1).strip()
+        return ""
+
+    def extract(self, text: str, fields: Optional[Iterable[str]] = None) -> Dict[str, str]:
+        """
+        Extrai todos os campos (ou apenas `fields`) de uma vez
+
+        Returns:
+            Dict[str, str]: campo -> valor ("" se não encontrado)
+        """
+        return {field: self.extract_one(text, field) for field in (fields or self.fields)}
+
+    def has_fields(self, text: str, fields: Iterable[str]) -> bool:
+        """Verifica se todos os campos existem no texto, parando no primeiro ausente"""
+        return all(self.extract_one(text, field) for field in fields)
+
+
+class CompiledTemplate:
+    """Template compilado: padrões pré-compilados e layout de nome validado"""
+
+    def __init__(self, name: str, spec: Dict[str, Any]):
+        self.name = name
+        self.regex_patterns = spec["regex_patterns"]
+        self.ocr_regions = spec.get("ocr_regions")
+        self.anchors = spec.get("anchors", [])
+        self.extractor = FieldExtractor(self.regex_patterns)
+        self.layout = [self._compile_part(part) for part in spec.get("name_layout", [])]
+
+    def _compile_part(self, part: Dict[str, Any]) -> Dict[str, Any]:
+        """Valida uma parte do layout e resolve seus normalizadores"""
+        field = part["field"]
+        if field not in self.regex_patterns:
+            raise ValueError(f"Template '{self.name}': campo desconhecido no layout: {field}")
+
+        names = part.get("normalize", [])
+        if isinstance(names, str):
+            names = [names]
+        for name in names:
+            if name not in NORMALIZERS:
+                raise ValueError(f"Template '{self.name}': normalizador desconhecido: {name}")
+
+        return {
+            "field": field,
+            "normalizers": [NORMALIZERS[name] for name in names],
+            "max_length": part.get("max_length"),
+            "format": part.get("format", "{value}"),
+            "when_pattern": part.get("when_pattern")
         }
-    }
-}
+
+    def parts_for(self, pattern: str) -> List[Dict[str, Any]]:
+        """Partes do layout ativas para o padrão de nomenclatura"""
+        return [
+            part for part in self.layout
+            if part["when_pattern"] is None or part["when_pattern"] in pattern
+        ]
+
+    def required_fields(self, pattern: str) -> List[str]:
+        """Campos usados no nome para o padrão de nomenclatura"""
+        return [part["field"] for part in self.parts_for(pattern)]
+
+    def name_builder(self, pattern, separator="_", prefix="", suffix="") -> Callable[[str], Optional[str]]:
+        """
+        Monta uma função texto -> nome com o padrão já resolvido, para ser
+        chamada uma vez por documento sem reinterpretar o padrão
+        """
+        extract_one = self.extractor.extract_one
+        steps = []
+        for part in self.parts_for(pattern):
+            steps.append((
+                part["field"],
+                tuple(part["normalizers"]),
+                part["max_length"],
+                part["format"].replace("{sep}", separator)
+            ))
+
+        def build(text: str) -> Optional[str]:
+            parts = [prefix] if prefix else []
+            for field, normalizers, max_length, template in steps:
+                value = extract_one(text, field)
+                if not value:
+                    continue
+                for normalize in normalizers:
+                    value = normalize(value)
+                if max_length:
+                    value = value[:max_length]
+                parts.append(template.replace("{value}", value))
+            if suffix:
+                parts.append(suffix)
+
+            if parts:
+                return clean_filename(separator.join(parts))
+            return None
+
+        return build
+
+
+# Registro de templates compilados (tipo de documento -> CompiledTemplate)
+REGISTRY: Dict[str, CompiledTemplate] = {}
+
+# Especificações dos templates registrados (compatível com o formato anterior)
+TEMPLATES: Dict[str, Dict[str, Any]] = {}
+
+# Extratores de campos por tipo de documento
+EXTRACTORS: Dict[str, FieldExtractor] = {}
+
+
+def register_template(name: str, spec: Dict[str, Any]) -> CompiledTemplate:
+    """Compila e registra (ou substitui) um template"""
+    compiled = CompiledTemplate(name, spec)
+    REGISTRY[name] = compiled
+    TEMPLATES[name] = spec
+    EXTRACTORS[name] = compiled.extractor
+    get_name_builder.cache_clear()
+    return compiled
+
+
+def register_templates_file(path) -> List[str]:
+    """Registra todos os templates de um arquivo JSON e retorna seus nomes"""
+    specs = load_templates(path)
+    for name, spec in specs.items():
+        register_template(name, spec)
+    return list(specs)
+
+
+@lru_cache(maxsize=256)
+def get_name_builder(doc_type, pattern, separator="_", prefix="", suffix=""):
+    """Função de nomenclatura pré-montada (em cache) para o tipo de documento e padrão"""
+    return REGISTRY[doc_type].name_builder(pattern, separator, prefix, suffix)
 
 
 def extract_field(text, field_name, regex_patterns):
@@ -51,6 +212,42 @@ def extract_field(text, field_name, regex_patterns):
     return ""
 
 
+def extract_fields(text, doc_type):
+    """Extrai todos os campos do template do tipo de documento"""
+    if doc_type not in REGISTRY:
+        return {}
+    return REGISTRY[doc_type].extractor.extract(text)
+
+
+def required_fields(doc_type, pattern):
+    """Retorna os campos que o nome gerado usa para o tipo de documento e padrão"""
+    if doc_type not in REGISTRY:
+        return []
+    return REGISTRY[doc_type].required_fields(pattern)
+
+
+class RequiredFieldsCheck:
+    """
+    Critério de parada para extração incremental: verdadeiro quando o texto
+    já contém todos os campos exigidos pelo padrão de nomenclatura
+
+    Implementado como classe (e não lambda) para poder ser enviado a processos
+    worker, e com repr estável para compor a chave do cache de OCR.
+    """
+
+    def __init__(self, doc_type, pattern):
+        self.doc_type = doc_type
+        self.fields = required_fields(doc_type, pattern)
+
+    def __call__(self, text):
+        if not self.fields:
+            return False
+        return REGISTRY[self.doc_type].extractor.has_fields(text, self.fields)
+
+    def __repr__(self):
+        return f"RequiredFieldsCheck({self.doc_type!r}, {self.fields!r})"
+
+
 def clean_filename(filename):
     """Remove caracteres inválidos do nome do arquivo"""
     filename = re.sub(r'[<>:"/\\|?*]', '', filename)
@@ -74,70 +271,11 @@ def generate_filename(text, doc_type, pattern, separator="_", prefix="", suffix=
     Returns:
         str: Nome de arquivo gerado (sem extensão)
     """
-    parts = []
-    
-    if prefix:
-        parts.append(prefix)
-    
-    if doc_type not in TEMPLATES:
+    if doc_type not in REGISTRY:
         return None
     
-    regex_patterns = TEMPLATES[doc_type]["regex_patterns"]
-    
-    # Gerar nome baseado no tipo de documento
-    if doc_type == "Notas Fiscais":
-        numero = extract_field(text, "numero", regex_patterns)
-        data = extract_field(text, "data", regex_patterns)
-        valor = extract_field(text, "valor", regex_patterns)
-        
-        if numero:
-            parts.append(f"NF{separator}{numero}")
-        if "Data" in pattern and data:
-            parts.append(data.replace("/", "-"))
-        if "Valor" in pattern and valor:
-            parts.append(f"R${valor.replace('.', '').replace(',', '.')}")
-    
-    elif doc_type == "Comprovantes de Pagamento":
-        fornecedor = extract_field(text, "fornecedor", regex_patterns)
-        data = extract_field(text, "data", regex_patterns)
-        valor = extract_field(text, "valor", regex_patterns)
-        
-        if fornecedor:
-            parts.append(fornecedor[:30])
-        if data:
-            parts.append(data.replace("/", "-"))
-        if valor:
-            parts.append(f"R${valor.replace('.', '').replace(',', '.')}")
-    
-    elif doc_type == "Processos Judiciais":
-        numero = extract_field(text, "numero", regex_patterns)
-        parte = extract_field(text, "parte", regex_patterns)
-        data = extract_field(text, "data", regex_patterns)
-        
-        if numero:
-            parts.append(f"Processo{separator}{numero}")
-        if "Parte" in pattern and parte:
-            parts.append(parte[:30])
-        if "Data" in pattern and data:
-            parts.append(data.replace("/", "-"))
-    
-    elif doc_type == "Processos de Sinistros":
-        numero = extract_field(text, "numero", regex_patterns)
-        segurado = extract_field(text, "segurado", regex_patterns)
-        data = extract_field(text, "data", regex_patterns)
-        
-        if numero:
-            parts.append(f"Sinistro{separator}{numero}")
-        if segurado:
-            parts.append(segurado[:30])
-        if data:
-            parts.append(data.replace("/", "-"))
-    
-    if suffix:
-        parts.append(suffix)
-    
-    if parts:
-        new_name = separator.join(parts)
-        return clean_filename(new_name)
-    
-    return None
+    return get_name_builder(doc_type, pattern, separator, prefix, suffix)(text)
+
+
+# Templates predefinidos para diferentes tipos de documentos
+register_templates_file(TEMPLATES_PATH)
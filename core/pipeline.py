@@ -0,0 +1,372 @@
+"""
+Pipeline em estágios produtor/consumidor com filas limitadas entre eles
+ingestão → triagem → extração → parsing → registro, cada estágio com seus
+próprios workers: leitura de disco, camada de texto, OCR e parsing se sobrepõem
+e o estágio mais lento dita a vazão
+"""
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, Any, Iterable, Iterator, List, Optional, Tuple, Union
+
+from core.ocr import has_text_layer, MIN_PAGE_TEXT_CHARS
+from core.parallel import ParallelExtractor, POOL_FAILURES, extract_file, parse_text
+
+
+_DONE = object()  # Sentinela de fim de fila (um por worker do estágio)
+_POLL_SECONDS = 0.1  # Intervalo para reavaliar o cancelamento em filas cheias/vazias
+
+# Nome da fila de saída (consumida por quem itera Pipeline.run)
+OUTPUT_STAGE = "persist"
+
+
+class Skip:
+    """Retorno de um estágio que encaminha o item direto para um estágio adiante"""
+
+    __slots__ = ("stage", "item")
+
+    def __init__(self, stage: str, item):
+        self.stage = stage
+        self.item = item
+
+
+class Stage:
+    """
+    Um estágio do pipeline: `func(item)` executada por `workers` threads
+
+    A função devolve o item (ou um novo item) para o próximo estágio, ou
+    Skip(nome, item) para pular estágios intermediários (ex.: PDFs com camada
+    de texto não passam pelo OCR). Uma exceção marca o item com "error" (e a
+    própria exceção em "exception") e o envia direto para a saída.
+    """
+
+    def __init__(self, name: str, func: Callable, workers: int = 1, maxsize: Optional[int] = None):
+        """
+        Args:
+            name: Nome do estágio (chave em Pipeline.depths/stats)
+            func: Função item -> item | Skip
+            workers: Threads consumindo a fila de entrada do estágio
+            maxsize: Capacidade da fila de entrada (default: 2 itens por worker)
+        """
+        if workers < 1:
+            raise ValueError(f"Estágio '{name}' precisa de ao menos um worker")
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.maxsize = maxsize or 2 * workers
+
+
+class Pipeline:
+    """
+    Executa os estágios em threads ligadas por filas limitadas
+
+    Um estágio com a fila de saída cheia fica bloqueado (back-pressure) até o
+    seguinte consumir; as filas cheias apontam o gargalo e as vazias, os
+    estágios com workers sobrando. depths() e stats() expõem esses números
+    para o ajuste de workers e capacidades.
+    """
+
+    def __init__(self, stages: List[Stage], output_maxsize: Optional[int] = None):
+        if not stages:
+            raise ValueError("Pipeline sem estágios")
+        names = [stage.name for stage in stages]
+        if len(set(names)) != len(names) or OUTPUT_STAGE in names:
+            raise ValueError(f"Nomes de estágio repetidos ou reservados: {names}")
+        self.stages = stages
+        self._index = {stage.name: i for i, stage in enumerate(stages)}
+        self._queues = [queue.Queue(stage.maxsize) for stage in stages]
+        self._output = queue.Queue(output_maxsize or 2 * stages[-1].workers)
+        self._remaining = [stage.workers for stage in stages]
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._stats = {name: {"processed": 0, "errors": 0, "busy_seconds": 0.0,
+                              "blocked_seconds": 0.0, "high_water": 0}
+                       for name in names + [OUTPUT_STAGE]}
+
+    def _queue_for(self, position: int) -> queue.Queue:
+        return self._queues[position] if position < len(self._queues) else self._output
+
+    def _put(self, position: int, item, source: Optional[str]) -> bool:
+        """Enfileira no estágio `position`, bloqueando enquanto a fila estiver cheia"""
+        target = self._queue_for(position)
+        start = time.perf_counter()
+        while not self._cancel.is_set():
+            try:
+                target.put(item, timeout=_POLL_SECONDS)
+            except queue.Full:
+                continue
+            name = self.stages[position].name if position < len(self.stages) else OUTPUT_STAGE
+            with self._lock:
+                if source:
+                    self._stats[source]["blocked_seconds"] += time.perf_counter() - start
+                if item is not _DONE:
+                    self._stats[name]["high_water"] = max(self._stats[name]["high_water"], target.qsize())
+            return True
+        return False
+
+    def _get(self, source: queue.Queue):
+        while not self._cancel.is_set():
+            try:
+                return source.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _close(self, position: int):
+        """Encerra o estágio seguinte quando todos os workers deste terminaram"""
+        with self._lock:
+            self._remaining[position] -= 1
+            if self._remaining[position]:
+                return
+        following = position + 1
+        count = self.stages[following].workers if following < len(self.stages) else 1
+        for _ in range(count):
+            self._put(following, _DONE, self.stages[position].name)
+
+    def _work(self, position: int):
+        stage = self.stages[position]
+        stats = self._stats[stage.name]
+        source = self._queues[position]
+        while True:
+            item = self._get(source)
+            if item is _DONE:
+                break
+            start = time.perf_counter()
+            try:
+                result = stage.func(item)
+                target = position + 1
+                if isinstance(result, Skip):
+                    target = self._index[result.stage]
+                    if target <= position:
+                        raise ValueError(f"Estágio '{stage.name}' só pode pular para frente")
+                    result = result.item
+            except Exception as e:
+                item["error"] = str(e)
+                item["exception"] = e
+                result, target = item, len(self.stages)
+                with self._lock:
+                    stats["errors"] += 1
+            with self._lock:
+                stats["busy_seconds"] += time.perf_counter() - start
+                stats["processed"] += 1
+            if not self._put(target, result, stage.name):
+                break
+        if not self._cancel.is_set():
+            self._close(position)
+
+    def _feed(self, items: Iterable):
+        for item in items:
+            if not self._put(0, item, None):
+                return
+        for _ in range(self.stages[0].workers):
+            self._put(0, _DONE, None)
+
+    def run(self, items: Iterable) -> Iterator:
+        """
+        Processa os itens e os devolve na ordem em que saem do último estágio
+
+        Os itens são lidos de `items` só quando a fila do primeiro estágio tem
+        espaço. Interromper a iteração cancela os estágios (os itens em
+        andamento são descartados). Cada Pipeline executa uma única vez.
+        """
+        threads = [threading.Thread(target=self._feed, args=(items,), daemon=True)]
+        for position, stage in enumerate(self.stages):
+            threads += [threading.Thread(target=self._work, args=(position,), daemon=True,
+                                         name=f"pipeline-{stage.name}-{n}")
+                        for n in range(stage.workers)]
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                item = self._get(self._output)
+                if item is _DONE:
+                    break
+                self._stats[OUTPUT_STAGE]["processed"] += 1
+                yield item
+        finally:
+            # Fim normal: as threads já estão saindo; interrupção: cancela as filas
+            self._cancel.set()
+            for thread in threads:
+                thread.join()
+
+    def depths(self) -> Dict[str, int]:
+        """Itens aguardando em cada fila, pelo nome do estágio que a consome"""
+        depths = {stage.name: q.qsize() for stage, q in zip(self.stages, self._queues)}
+        depths[OUTPUT_STAGE] = self._output.qsize()
+        return depths
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Por estágio: workers, capacidade e profundidade atual da fila de entrada,
+        maior profundidade observada ("high_water"), itens processados, erros,
+        tempo ocupado e tempo bloqueado esperando espaço na fila seguinte
+        """
+        depths = self.depths()
+        capacities = {stage.name: (stage.workers, stage.maxsize) for stage in self.stages}
+        capacities[OUTPUT_STAGE] = (1, self._output.maxsize)
+        return {name: {"workers": capacities[name][0], "maxsize": capacities[name][1],
+                       "depth": depths[name], **stats}
+                for name, stats in self._stats.items()}
+
+
+# Workers por estágio; "triage" são processos de um pool leve próprio e
+# "extract" usa os processos do pool de OCR (max_workers)
+DEFAULT_STAGE_WORKERS = {"ingest": 2, "triage": 2, "extract": None, "parse": 1}
+
+
+def _prefetch(path):
+    """Pede ao sistema a leitura antecipada do arquivo (sem trazer os bytes ao processo)"""
+    if hasattr(os, "posix_fadvise"):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+    else:
+        os.stat(path)  # Ao menos falha cedo se o arquivo sumiu
+
+
+def triage_file(file_content: Union[bytes, str], doc_type: str, pattern: str,
+                options: Dict[str, Any]) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """
+    Triagem de um arquivo (executada no pool de triagem)
+
+    Returns:
+        Tuple: (texto, estatísticas) se todas as páginas processadas têm camada de
+               texto - o PDF já sai extraído, sem passar pelo pool de OCR -
+               ou None se precisar de OCR
+    """
+    if isinstance(file_content, (str, os.PathLike)):
+        with open(file_content, "rb") as f:
+            file_content = f.read()
+    if not has_text_layer(file_content, options["max_pages"], MIN_PAGE_TEXT_CHARS):
+        return None
+    return extract_file(file_content, doc_type, pattern, options)
+
+
+class PipelineExtractor(ParallelExtractor):
+    """
+    Processa lotes em estágios concorrentes em vez de um pool de arquivos inteiros
+
+    - ingest: leitura antecipada do PDF no UploadStore (I/O; os bytes não passam
+      pelo processo principal)
+    - triage: verifica a camada de texto em um pool leve de processos; PDFs
+      digitais saem extraídos dali e pulam direto para o parsing, sem esperar
+      na fila do pool de OCR
+    - extract: renderização + Tesseract no pool de OCR (uma thread por processo)
+    - parse: classificação e geração do nome
+    - persist: registro no BatchManager, na thread de quem itera process_batch
+
+    O PyMuPDF só roda nos processos dos pools, que recebem o caminho do
+    arquivo (ou os bytes, quando files_data não é um UploadStore).
+    Mesma interface e mesmos eventos de ParallelExtractor.process_batch.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None,
+                 stage_workers: Optional[Dict[str, int]] = None,
+                 queue_sizes: Optional[Dict[str, int]] = None, **options):
+        """
+        Args:
+            max_workers: Processos de OCR (default: número de núcleos)
+            stage_workers: Workers por estágio (ver DEFAULT_STAGE_WORKERS)
+            queue_sizes: Capacidade da fila de entrada por estágio
+                         (default: 2 itens por worker; chave "persist" para a saída)
+            **options: Opções de extração (ver DEFAULT_OPTIONS)
+        """
+        super().__init__(max_workers=max_workers, **options)
+        self.stage_workers = {**DEFAULT_STAGE_WORKERS, **(stage_workers or {})}
+        if self.stage_workers["extract"] is None:
+            self.stage_workers["extract"] = self.max_workers
+        self.queue_sizes = dict(queue_sizes or {})
+        self.pipeline: Optional[Pipeline] = None  # Pipeline do lote atual (ou do último)
+        self._triage_executor = None
+
+    def _get_triage_executor(self):
+        """Pool da triagem, criado sob demanda e reutilizado entre lotes"""
+        if self._triage_executor is None:
+            self._triage_executor = self._new_pool(self.stage_workers["triage"])
+        return self._triage_executor
+
+    def shutdown(self):
+        super().shutdown()
+        if self._triage_executor is not None:
+            self._triage_executor.shutdown(wait=True, cancel_futures=True)
+            self._triage_executor = None
+
+    def _discard_executor(self):
+        super()._discard_executor()
+        if self._triage_executor is not None:
+            self._triage_executor.shutdown(wait=False, cancel_futures=True)
+            self._triage_executor = None
+
+    def _build(self, doc_type: str, pattern: str) -> Pipeline:
+        executor = self._get_executor()
+        triage_executor = self._get_triage_executor()
+        options = self.options
+
+        def ingest(item):
+            if isinstance(item["source"], (str, os.PathLike)):
+                _prefetch(item["source"])
+            return item
+
+        def triage(item):
+            extracted = triage_executor.submit(triage_file, item["source"], doc_type,
+                                               pattern, options).result()
+            item["text_layer"] = extracted is not None
+            if extracted is None:
+                return item
+            item["text"], item["stats"] = extracted
+            return Skip("parse", item)
+
+        def extract(item):
+            future = executor.submit(extract_file, item["source"], doc_type, pattern, options)
+            item["text"], item["stats"] = future.result()
+            return item
+
+        def parse(item):
+            item["result"] = parse_text(item["file_name"], item["text"], item["stats"],
+                                        doc_type, pattern, item["idx"])
+            item["text"] = None
+            return item
+
+        stages = [Stage(name, func, self.stage_workers[name], self.queue_sizes.get(name))
+                  for name, func in (("ingest", ingest), ("triage", triage),
+                                     ("extract", extract), ("parse", parse))]
+        return Pipeline(stages, self.queue_sizes.get(OUTPUT_STAGE))
+
+    def process_batch(self, batch_manager, batch_id: str, files_data,
+                      known_results: Optional[Dict[str, Dict[str, Any]]] = None,
+                      resume: bool = True) -> Iterator[Dict[str, Any]]:
+        """Ver ParallelExtractor.process_batch"""
+        batch = batch_manager.get_batch(batch_id)
+        if not batch:
+            return
+        if known_results is None:
+            known_results = {}
+
+        jobs, members, payloads = [], {}, {}
+        yield from self._schedule(batch_manager, batch_id, batch, files_data, known_results,
+                                  resume, jobs, members, payloads)
+        if not jobs:
+            return
+
+        self.pipeline = self._build(batch["doc_type"], batch["pattern"])
+        items = ({"key": key, "idx": idx, "file_name": file_name, "source": source}
+                 for key, idx, file_name, source in jobs)
+        pool_failure = None
+        for item in self.pipeline.run(items):
+            key = item["key"]
+            if isinstance(item.get("exception"), POOL_FAILURES):
+                pool_failure = pool_failure or item["exception"]  # Arquivo continua pendente
+            elif "error" in item:
+                yield from self._record_error(batch_manager, batch_id, members[key], item["error"])
+            else:
+                yield from self._record_members(batch_manager, batch_id, item["result"], key,
+                                                known_results, members, payloads)
+        self._raise_pool_failure(pool_failure)
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Profundidade das filas do lote em andamento (vazio antes do primeiro lote)"""
+        return self.pipeline.depths() if self.pipeline else {}
@@ -0,0 +1,161 @@
+"""
+Armazenamento em disco dos PDFs enviados, endereçado pelo hash do conteúdo
+Os uploads são gravados uma única vez e circulam como handles leves
+({"sha256", "size", "path"}) entre interface, lotes, worker e exportação
+"""
+import hashlib
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, Iterable, BinaryIO
+
+from core.dedup import content_hash
+
+
+DEFAULT_UPLOAD_DIR = "data/uploads"
+CHUNK_SIZE = 1024 * 1024  # Leitura/gravação em blocos de 1 MB
+
+# Política de despejo (ver UploadStore.evict)
+UNREFERENCED_GRACE_SECONDS = 3600        # Upload ainda não enfileirado em nenhum lote
+MAX_AGE_SECONDS = 7 * 24 * 3600          # Mesmo prazo de clear_completed_batches
+
+
+class UploadStore:
+    """
+    Um arquivo por conteúdo em <raiz>/<sha256[:2]>/<sha256>.pdf
+
+    Expõe get/[]/in/handle pelo sha256, podendo ser passado diretamente como
+    files_data para ParallelExtractor.process_batch (os workers recebem o
+    caminho, não os bytes).
+    """
+
+    def __init__(self, root=DEFAULT_UPLOAD_DIR):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path(self, sha256: str) -> Path:
+        """Caminho do arquivo de um conteúdo"""
+        return self.root / sha256[:2] / f"{sha256}.pdf"
+
+    def handle(self, sha256: str) -> Optional[Dict[str, Any]]:
+        """Handle {"sha256", "size", "path"} de um conteúdo armazenado ou None"""
+        path = self.path(sha256)
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            return None
+        return {"sha256": sha256, "size": size, "path": str(path)}
+
+    def _commit(self, tmp_path: str, sha256: str):
+        """Move o temporário para o destino (ou o descarta se o conteúdo já existir)"""
+        target = self.path(sha256)
+        if target.exists():
+            os.unlink(tmp_path)
+            os.utime(target)  # Conteúdo reenviado: reinicia a contagem de idade
+        else:
+            target.parent.mkdir(exist_ok=True)
+            # Rename atômico: o worker nunca lê um PDF pela metade
+            os.replace(tmp_path, target)
+
+    def put(self, content: bytes, sha256: Optional[str] = None) -> str:
+        """
+        Grava um conteúdo já em memória (uma única vez por hash)
+
+        Returns:
+            str: sha256 do conteúdo
+        """
+        sha256 = sha256 or content_hash(content)
+        if self.path(sha256).exists():
+            os.utime(self.path(sha256))
+            return sha256
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        self._commit(tmp_path, sha256)
+        return sha256
+
+    def put_stream(self, stream: BinaryIO) -> Dict[str, Any]:
+        """
+        Copia um arquivo aberto (upload, membro de ZIP) para o disco em blocos,
+        calculando o hash durante a cópia - o conteúdo nunca fica inteiro na memória
+
+        Returns:
+            Dict: Handle {"sha256", "size", "path"}
+        """
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        sha256 = digest.hexdigest()
+        self._commit(tmp_path, sha256)
+        return {"sha256": sha256, "size": size, "path": str(self.path(sha256))}
+
+    def get(self, sha256: str, default=None) -> Optional[bytes]:
+        """Conteúdo de um hash ou `default` se não estiver armazenado"""
+        try:
+            return self.path(sha256).read_bytes()
+        except FileNotFoundError:
+            return default
+
+    def __getitem__(self, sha256: str) -> bytes:
+        content = self.get(sha256)
+        if content is None:
+            raise KeyError(sha256)
+        return content
+
+    def __contains__(self, sha256: str) -> bool:
+        return self.path(sha256).exists()
+
+    def usage(self) -> Dict[str, int]:
+        """Arquivos e bytes ocupados no disco"""
+        files = list(self.root.glob("*/*.pdf"))
+        return {"files": len(files), "bytes": sum(f.stat().st_size for f in files)}
+
+    def evict(self, referenced: Optional[Iterable[str]] = None,
+              unreferenced_grace: float = UNREFERENCED_GRACE_SECONDS,
+              max_age: float = MAX_AGE_SECONDS) -> Dict[str, int]:
+        """
+        Remove conteúdos que não são mais necessários:
+        - sem referência de nenhum lote há mais de `unreferenced_grace` segundos
+          (o prazo cobre o intervalo entre o upload e a criação dos lotes)
+        - sem uso há mais de `max_age` segundos, mesmo que referenciados
+
+        Args:
+            referenced: Hashes ainda usados pelos lotes (ver BatchManager.content_refs)
+
+        Returns:
+            Dict: {"files": arquivos removidos, "bytes": bytes liberados}
+        """
+        referenced = set(referenced or ())
+        now = time.time()
+        removed = {"files": 0, "bytes": 0}
+
+        # A interface ("Limpar") e o worker ocioso podem despejar ao mesmo tempo:
+        # arquivos que somem entre o glob e o stat/unlink são ignorados
+        for path in self.root.glob("*/*.pdf"):
+            try:
+                stat = path.stat()
+                age = now - stat.st_mtime
+                if age > max_age or (path.stem not in referenced and age > unreferenced_grace):
+                    path.unlink()
+                    removed["files"] += 1
+                    removed["bytes"] += stat.st_size
+            except FileNotFoundError:
+                continue
+        for path in self.root.glob("*.tmp"):
+            # Cópias interrompidas (queda durante o upload)
+            try:
+                if now - path.stat().st_mtime > unreferenced_grace:
+                    path.unlink()
+            except FileNotFoundError:
+                continue
+        return removed
@@ -0,0 +1,187 @@
+"""
+Worker em segundo plano: consome os lotes pendentes do BatchManager
+Roda fora do Streamlit (python main.py); a interface apenas enfileira e acompanha
+"""
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Any, Optional
+
+from core.batch_manager import BatchManager
+from core.parallel import ParallelExtractor
+from core.upload_store import UploadStore
+
+
+DEFAULT_LEASE_SECONDS = 60
+DEFAULT_POLL_INTERVAL = 2.0
+DEFAULT_EVICT_INTERVAL = 600  # Limpeza do UploadStore com a fila vazia (segundos)
+# Quedas seguidas do pool no mesmo lote antes de marcá-lo como "failed"
+# (um PDF que derruba o MuPDF/Tesseract toda vez não fica em loop na fila)
+MAX_POOL_FAILURES = 3
+
+
+class _Heartbeat(threading.Thread):
+    """Renova o lease do lote em andamento (e o anúncio do worker) a cada terço do lease"""
+
+    def __init__(self, batch_manager, batch_id, worker_id, lease_seconds, on_beat=None):
+        super().__init__(daemon=True)
+        self.batch_manager = batch_manager
+        self.batch_id = batch_id
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.on_beat = on_beat
+        self.lost = threading.Event()  # Lease perdido: outro worker assumiu o lote
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.lease_seconds / 3):
+            if self.on_beat:
+                self.on_beat()
+            if not self.batch_manager.renew_lease(self.batch_id, self.worker_id, self.lease_seconds):
+                self.lost.set()
+                return
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class BatchWorker:
+    """Reserva lotes com lease, processa em paralelo e registra o progresso"""
+
+    def __init__(self, batch_manager: Optional[BatchManager] = None,
+                 uploads: Optional[UploadStore] = None,
+                 extractor: Optional[ParallelExtractor] = None,
+                 worker_id: Optional[str] = None,
+                 lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 evict_interval: float = DEFAULT_EVICT_INTERVAL,
+                 on_batch: Optional[Callable[[str], None]] = None):
+        """
+        Args:
+            batch_manager: Fila de lotes (default: BatchManager() no SQLite padrão)
+            uploads: Conteúdo dos PDFs enfileirados (default: UploadStore())
+            extractor: Motor de extração (default: ParallelExtractor())
+            worker_id: Identificador nos leases (default: host-pid-aleatório)
+            lease_seconds: Duração do lease; sem heartbeat nesse intervalo o lote
+                           volta a ficar disponível para outro worker
+            poll_interval: Espera entre consultas quando a fila está vazia
+            evict_interval: Intervalo mínimo entre despejos do UploadStore
+                            (conteúdos sem lote que os referencie ou antigos)
+            on_batch: Chamada opcional com o ID de cada lote ao terminá-lo
+                      (ex.: registrar as filas do PipelineExtractor)
+        """
+        self.batch_manager = batch_manager or BatchManager()
+        self.uploads = uploads or UploadStore()
+        self.extractor = extractor or ParallelExtractor()
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.evict_interval = evict_interval
+        self.on_batch = on_batch
+        self._last_evict = 0.0
+        # Resultados por hash, reaproveitados entre lotes com o mesmo tipo e padrão
+        self._known_results: Dict[tuple, Dict[str, Dict[str, Any]]] = {}
+        self._pool_failures: Dict[str, int] = {}  # lote -> quedas seguidas do pool
+        self._stopping = threading.Event()
+
+    def stop(self):
+        """Pede o encerramento; o lote em andamento volta para a fila e será retomado"""
+        self._stopping.set()
+
+    def announce(self):
+        """
+        Anuncia o worker na fila por um lease (a interface mostra "worker offline"
+        sem anúncios e dimensiona os lotes pelos processos dos workers ativos)
+        """
+        self.batch_manager.register_worker(
+            self.worker_id, {"processes": self.extractor.max_workers}, self.lease_seconds
+        )
+
+    def process_next(self) -> Optional[str]:
+        """
+        Reserva e processa um lote
+
+        Returns:
+            str: ID do lote processado ou None se a fila estiver vazia
+        """
+        batch_id = self.batch_manager.claim_batch(self.worker_id, self.lease_seconds)
+        if batch_id is None:
+            return None
+
+        # Lote retomado de um worker que parou no meio: process_batch pula os
+        # arquivos já registrados e continua do primeiro pendente
+        batch = self.batch_manager.get_batch(batch_id)
+
+        known_results = self._known_results.setdefault((batch["doc_type"], batch["pattern"]), {})
+        heartbeat = _Heartbeat(self.batch_manager, batch_id, self.worker_id, self.lease_seconds,
+                               on_beat=self.announce)
+        heartbeat.start()
+        status = "completed"
+        try:
+            for _ in self.extractor.process_batch(self.batch_manager, batch_id, self.uploads, known_results):
+                if heartbeat.lost.is_set():
+                    return batch_id  # Outro worker assumiu; não registrar mais nada
+                if self._stopping.is_set():
+                    status = "pending"
+                    break
+        except BrokenProcessPool as e:
+            # Processo do pool morto (ex.: falta de memória): o lote volta para a
+            # fila e é retomado dos arquivos sem resultado, com um pool novo
+            failures = self._pool_failures.get(batch_id, 0) + 1
+            self._pool_failures[batch_id] = failures
+            status = "pending"
+            if failures >= MAX_POOL_FAILURES:
+                self.batch_manager.add_batch_error(batch_id, {"file": None, "error": str(e)})
+                self._pool_failures.pop(batch_id)
+                status = "failed"
+        except Exception as e:
+            self.batch_manager.add_batch_error(batch_id, {"file": None, "error": str(e)})
+            status = "failed"
+        else:
+            self._pool_failures.pop(batch_id, None)
+        finally:
+            heartbeat.stop()
+
+        self.batch_manager.release_batch(batch_id, self.worker_id, status)
+        if self.on_batch:
+            self.on_batch(batch_id)
+        return batch_id
+
+    def run(self, once: bool = False) -> int:
+        """
+        Processa lotes até stop() (ou até esvaziar a fila, com once=True)
+
+        Returns:
+            int: Número de lotes processados
+        """
+        processed = 0
+        # Lotes interrompidos sem lease ativo voltam para a fila na inicialização
+        self.batch_manager.resume_interrupted()
+        try:
+            while not self._stopping.is_set():
+                self.announce()
+                if self.process_next() is not None:
+                    processed += 1
+                    continue
+                if once:
+                    break
+                # Fila vazia: libera a memória dos resultados reaproveitáveis e o disco
+                self._known_results.clear()
+                if time.monotonic() - self._last_evict >= self.evict_interval:
+                    self.uploads.evict(self.batch_manager.content_refs())
+                    self._last_evict = time.monotonic()
+                self._stopping.wait(self.poll_interval)
+        finally:
+            self.batch_manager.unregister_worker(self.worker_id)
+            self.extractor.shutdown()
+        return processed
+
+    def install_signal_handlers(self):
+        """SIGTERM/SIGINT (ex.: reinício do servidor) encerram o worker sem perder o lote"""
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: self.stop())
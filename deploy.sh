@@ -22,5 +22,8 @@ serverAddress = "0.0.0.0"
 gatherUsageStats = false
 EOF
 
+# Iniciar o worker de processamento em segundo plano (consome os lotes enfileirados)
+python main.py &
+
 # Iniciar Streamlit
 exec streamlit run app.py --server.port=$DEPLOY_PORT --server.address=0.0.0.0 --server.headless=true
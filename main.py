@@ -1,5 +1,120 @@
+"""
+Worker de processamento em segundo plano
+
+Reserva os lotes pendentes criados pela interface (app.py), extrai o texto,
+gera os novos nomes e registra o progresso no armazenamento de lotes.
+
+Uso:
+    python main.py [--workers 4] [--lease 60] [--poll 2] [--once]
+    python main.py --pipeline [--stage-workers ingest=2,triage=2,parse=1]
+    python main.py --dpi-ladder 100,150,225 [--min-confidence 60]
+"""
+import argparse
+from pathlib import Path
+
+from core.batch_manager import BatchManager
+from core.batch_store import DEFAULT_STORE_PATH
+from core.ocr import MIN_OCR_CONFIDENCE
+from core.parallel import ParallelExtractor, DEFAULT_OPTIONS
+from core.pipeline import PipelineExtractor, DEFAULT_STAGE_WORKERS
+from core.upload_store import UploadStore, DEFAULT_UPLOAD_DIR
+from core.worker import BatchWorker, DEFAULT_LEASE_SECONDS, DEFAULT_POLL_INTERVAL
+
+
+def parse_stage_workers(value: str) -> dict:
+    """Converte "ingest=2,triage=2" em {"ingest": 2, "triage": 2}"""
+    workers = {}
+    for part in filter(None, value.split(",")):
+        name, _, count = part.partition("=")
+        if name not in DEFAULT_STAGE_WORKERS or not count.isdigit() or int(count) < 1:
+            raise argparse.ArgumentTypeError(f"Estágio inválido: '{part}'")
+        workers[name] = int(count)
+    return workers
+
+
+def parse_dpi_ladder(value: str) -> tuple:
+    """Converte "100,150,225" em (100, 150, 225), exigindo DPIs crescentes"""
+    try:
+        ladder = tuple(int(dpi) for dpi in value.split(",") if dpi)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Escada de DPI inválida: '{value}'")
+    if not ladder or any(dpi <= 0 for dpi in ladder) or list(ladder) != sorted(set(ladder)):
+        raise argparse.ArgumentTypeError(f"Escada de DPI deve ser crescente: '{value}'")
+    return ladder
+
+
+def parse_storage(value: str) -> str:
+    """Aceita só o SQLite: os backends JSON mantêm os lotes na memória de um único processo"""
+    if Path(value).suffix == ".json":
+        raise argparse.ArgumentTypeError(
+            f"Armazenamento JSON não é compartilhado entre a interface e o worker: '{value}' "
+            f"(use um banco SQLite, ex.: {DEFAULT_STORE_PATH})"
+        )
+    return value
+
+
+def print_pipeline_stats(extractor: PipelineExtractor, batch_id: str):
+    """Uma linha por lote com a ocupação de cada estágio (para ajustar workers e filas)"""
+    if extractor.pipeline is None:
+        return
+    stages = "  ".join(
+        f"{name}: {s['processed']} itens, {s['busy_seconds']:.1f}s ocupado, "
+        f"{s['blocked_seconds']:.1f}s bloqueado, fila máx {s['high_water']}/{s['maxsize']}"
+        for name, s in extractor.pipeline.stats().items()
+    )
+    print(f"Lote {batch_id} | {stages}", flush=True)
+
+
 def main():
-    print("Hello from repl-nix-workspace!")
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processos de extração (default: um por núcleo)")
+    parser.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS,
+                        help="Duração do lease de um lote em segundos")
+    parser.add_argument("--poll", type=float, default=DEFAULT_POLL_INTERVAL,
+                        help="Intervalo de consulta da fila vazia em segundos")
+    parser.add_argument("--storage", type=parse_storage, default=DEFAULT_STORE_PATH,
+                        help="Banco SQLite dos lotes (o mesmo da interface)")
+    parser.add_argument("--uploads", default=DEFAULT_UPLOAD_DIR, help="Pasta dos PDFs enfileirados")
+    parser.add_argument("--once", action="store_true", help="Encerra quando a fila esvaziar")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Processa em estágios concorrentes (ingestão, triagem, OCR, parsing)")
+    parser.add_argument("--stage-workers", type=parse_stage_workers, default={},
+                        help="Workers por estágio com --pipeline (ex.: ingest=2,triage=2,parse=1)")
+    parser.add_argument("--max-pages", type=int, default=DEFAULT_OPTIONS["max_pages"],
+                        help="Páginas extraídas por PDF")
+    parser.add_argument("--dpi", type=int, default=DEFAULT_OPTIONS["dpi"],
+                        help="Resolução do OCR (sem --dpi-ladder)")
+    parser.add_argument("--dpi-ladder", type=parse_dpi_ladder, default=DEFAULT_OPTIONS["dpi_ladder"],
+                        help="OCR adaptativo: DPIs crescentes tentados enquanto a confiança "
+                             "ficar abaixo de --min-confidence (ex.: 100,150,225)")
+    parser.add_argument("--min-confidence", type=float, default=MIN_OCR_CONFIDENCE,
+                        help="Confiança média (0-100) para aceitar uma página com --dpi-ladder")
+    args = parser.parse_args()
+
+    options = {"max_pages": args.max_pages, "dpi": args.dpi,
+               "dpi_ladder": args.dpi_ladder, "min_confidence": args.min_confidence}
+    on_batch = None
+    if args.pipeline:
+        extractor = PipelineExtractor(max_workers=args.workers, stage_workers=args.stage_workers,
+                                      **options)
+        on_batch = lambda batch_id: print_pipeline_stats(extractor, batch_id)
+    else:
+        extractor = ParallelExtractor(max_workers=args.workers, **options)
+
+    worker = BatchWorker(
+        batch_manager=BatchManager(storage_path=args.storage),
+        uploads=UploadStore(args.uploads),
+        extractor=extractor,
+        lease_seconds=args.lease,
+        poll_interval=args.poll,
+        on_batch=on_batch
+    )
+    worker.install_signal_handlers()
+    print(f"Worker {worker.worker_id} aguardando lotes...", flush=True)
+    processed = worker.run(once=args.once)
+    print(f"Worker {worker.worker_id} encerrado ({processed} lotes processados)", flush=True)
 
 
 if __name__ == "__main__":
@@ -3,6 +3,12 @@
 # Script para verificar e iniciar o Streamlit manualmente
 # Uso: bash start.sh
 
+# Worker de processamento (consome os lotes enfileirados pela interface)
+if ! pgrep -f "python main.py" > /dev/null; then
+    echo "⚙️  Iniciando worker de processamento..."
+    nohup python main.py > /tmp/worker.log 2>&1 &
+fi
+
 echo "🔍 Verificando se o Streamlit está rodando..."
 
 # Verificar se o processo está ativo
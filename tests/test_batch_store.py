@@ -0,0 +1,143 @@
+"""
+Comportamento dos backends de lotes: replay do journal, leases e retomada
+"""
+import time
+
+import pytest
+
+from core.batch_manager import BatchManager
+from core.batch_store import JournaledBatchStore
+from core.parallel import ParallelExtractor
+from core.parser import TEMPLATES, generate_filename
+
+
+DOC_TYPE = "Notas Fiscais"
+PATTERN = "NF + Número"  # Padrão sugerido pela interface
+FILES = [{"name": f"doc{i}.pdf", "sha256": f"sha{i}", "size": 100} for i in range(3)]
+
+
+def result(i):
+    """Resultado como o registrado pelo extrator para o arquivo doc{i}.pdf"""
+    text = f"Nota Fiscal Nº 00451{i} Data 03/02/2025 Valor R$ 1.234,56"
+    return {"original": f"doc{i}.pdf", "novo": f"{generate_filename(text, DOC_TYPE, PATTERN)}.pdf"}
+
+
+def make_manager(path, **kwargs):
+    return BatchManager(batch_size=len(FILES), storage_path=path, **kwargs)
+
+
+@pytest.fixture(params=["batches.db", "batches.json", "journal.json"])
+def manager(request, tmp_path):
+    """BatchManager em cada backend (SQLite, JSON e JSON com journal)"""
+    journal = {"flush_every": 1} if request.param == "journal.json" else None
+    manager = make_manager(tmp_path / request.param, journal=journal)
+    yield manager
+    manager.store.close()
+
+
+def test_fixtures_use_a_known_template():
+    assert DOC_TYPE in TEMPLATES
+    assert result(0)["novo"] == "NF_004510.pdf"
+
+
+def reopen(path):
+    """Novo JournaledBatchStore sobre o mesmo snapshot + journals (como após uma queda)"""
+    return JournaledBatchStore(path, flush_every=1)
+
+
+def test_journal_replay_keeps_lease_transitions(tmp_path):
+    path = tmp_path / "journal.json"
+    manager = make_manager(path, journal={"flush_every": 1})
+    batch_id, = manager.create_batches(FILES, DOC_TYPE, PATTERN)
+
+    assert manager.claim_batch("w1", 60) == batch_id
+    manager.add_batch_result(batch_id, result(0))
+    manager.add_batch_error(batch_id, {"file": "doc1.pdf", "error": "ilegível"})
+
+    # Queda com o lote reservado: o replay devolve o lease e o progresso
+    store = reopen(path)
+    batch = store.get(batch_id)
+    assert batch["status"] == "processing"
+    assert batch["lease_owner"] == "w1"
+    assert (batch["processed_files"], batch["failed_files"]) == (1, 1)
+    store.close()
+
+    manager.add_batch_result(batch_id, result(2))
+    assert manager.release_batch(batch_id, "w1", "completed")
+    manager.store.close()
+
+    store = reopen(path)
+    batch = store.get(batch_id)
+    assert batch["status"] == "completed"
+    assert batch["lease_owner"] is None
+    assert batch["processed_files"] == 2
+    assert [(r["original"], r["novo"]) for r in batch["results"]] == [
+        ("doc0.pdf", "NF_004510.pdf"), ("doc2.pdf", "NF_004512.pdf")
+    ]
+    store.close()
+
+
+def test_journal_replay_is_idempotent(tmp_path):
+    path = tmp_path / "journal.json"
+    manager = make_manager(path, journal={"flush_every": 1, "snapshot_every": 10_000})
+    batch_id, = manager.create_batches(FILES, DOC_TYPE, PATTERN)
+    manager.add_batch_result(batch_id, result(0))
+    manager.store.close()
+
+    # Reabrir duas vezes não duplica os registros já aplicados
+    reopen(path).close()
+    store = reopen(path)
+    assert store.get(batch_id)["processed_files"] == 1
+    assert [r["novo"] for r in store.get(batch_id)["results"]] == ["NF_004510.pdf"]
+    store.close()
+
+
+def test_claim_is_exclusive_until_release(manager):
+    batch_id, = manager.create_batches(FILES, DOC_TYPE, PATTERN)
+
+    assert manager.claim_batch("w1", 60) == batch_id
+    assert manager.claim_batch("w2", 60) is None
+    assert manager.get_batch(batch_id)["lease_owner"] == "w1"
+
+    assert manager.renew_lease(batch_id, "w1", 60)
+    assert not manager.renew_lease(batch_id, "w2", 60)
+    assert not manager.release_batch(batch_id, "w2", "completed")
+
+    assert manager.release_batch(batch_id, "w1", "pending")
+    batch = manager.get_batch(batch_id)
+    assert batch["status"] == "pending"
+    assert batch["lease_owner"] is None
+    assert manager.claim_batch("w2", 60) == batch_id
+
+
+def test_expired_lease_is_reclaimed(manager):
+    batch_id, = manager.create_batches(FILES, DOC_TYPE, PATTERN)
+
+    assert manager.claim_batch("w1", 0.05) == batch_id
+    time.sleep(0.1)
+    # Worker parado sem heartbeat: outro assume e o antigo perde o lease
+    assert manager.claim_batch("w2", 60) == batch_id
+    assert not manager.renew_lease(batch_id, "w1", 60)
+    assert manager.get_batch(batch_id)["lease_owner"] == "w2"
+
+
+def test_resume_skips_recorded_files(manager):
+    batch_id, = manager.create_batches(FILES, DOC_TYPE, PATTERN)
+    manager.claim_batch("w1", 60)
+    manager.add_batch_result(batch_id, result(0))
+    manager.add_batch_error(batch_id, {"file": "doc1.pdf", "error": "ilegível"})
+    manager.release_batch(batch_id, "w1", "failed")
+
+    assert manager.get_batch(batch_id)["results"][0]["novo"] == "NF_004510.pdf"
+    assert [f["name"] for f in manager.pending_files(batch_id)] == ["doc2.pdf"]
+    assert manager.resume_batch(batch_id)
+    assert manager.get_batch(batch_id)["status"] == "pending"
+
+    # O extrator só agenda o arquivo ainda sem resultado nem erro
+    jobs, members, payloads = [], {}, {}
+    contents = {f["sha256"]: b"%PDF-1.4" for f in FILES}
+    events = list(ParallelExtractor(max_workers=1)._schedule(
+        manager, batch_id, manager.get_batch(batch_id), contents, {}, True, jobs, members, payloads
+    ))
+    assert events == []
+    assert [job[2] for job in jobs] == ["doc2.pdf"]
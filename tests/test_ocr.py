@@ -0,0 +1,45 @@
+"""
+Detecção de páginas em branco antes do OCR, sobre scans sintéticos
+"""
+import fitz
+import numpy as np
+import pytest
+
+from core.ocr import BLANK_INK_THRESHOLD, _is_blank_page
+
+
+LINE = "Recibo 004512 - Valor R$ 1.234,56 - Cliente Fulano de Tal"
+
+
+def scanned_page(lines=0, fontsize=8, gray=0.0, noise=0.0):
+    """Página só com imagem (sem camada de texto), como a de um scanner"""
+    source = fitz.open()
+    page = source.new_page()
+    for i in range(lines):
+        page.insert_text((50, 60 + i * (fontsize + 6)), LINE, fontsize=fontsize, color=(gray,) * 3)
+    pix = page.get_pixmap(dpi=150, colorspace=fitz.csGRAY)
+    if noise:
+        pixels = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+        grain = np.random.default_rng(0).normal(0, noise, pixels.shape)
+        pixels = np.clip(pixels + grain, 0, 255).astype(np.uint8)
+        pix = fitz.Pixmap(fitz.csGRAY, pix.width, pix.height, pixels.tobytes(), False)
+
+    scan = fitz.open()
+    scan.new_page(width=page.rect.width, height=page.rect.height).insert_image(page.rect, pixmap=pix)
+    return scan[0]
+
+
+@pytest.mark.parametrize("lines, fontsize, gray", [
+    (40, 8, 0.55),  # Recibo desbotado: página inteira em cinza claro
+    (1, 10, 0.40),  # Uma linha em cinza
+    (1, 8, 0.0),    # Uma linha preta pequena
+])
+def test_faded_text_goes_to_ocr(lines, fontsize, gray):
+    page_stat = {}
+    assert not _is_blank_page(scanned_page(lines, fontsize, gray), BLANK_INK_THRESHOLD, page_stat)
+    assert page_stat["ink"] > 0
+
+
+@pytest.mark.parametrize("noise", [0.0, 6.0])
+def test_empty_scan_is_blank(noise):
+    assert _is_blank_page(scanned_page(noise=noise), BLANK_INK_THRESHOLD, {})